@@ -1,15 +1,36 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, Response
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    ORJSONResponse,
+    PlainTextResponse,
+    Response,
+)
 
-from app.routers import products
+from app.routers import admin, products
+from app.services.cache import ResponseCache
+from app.services.executor import BoundedExecutor, ExecutorBusyError
+from app.services.metrics import (
+    DATASET_LOAD_SECONDS,
+    REGISTRY,
+    MetricsMiddleware,
+    format_metric,
+)
 from app.services.products import init_product_db
+from app.services.reload import watch_product_db
+
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,16 +38,52 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 API_VERSION = os.getenv("API_VERSION", "v1")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "dev")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "3600"))
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "3600"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+RELOAD_INTERVAL = float(os.getenv("RELOAD_INTERVAL", "0"))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS") or os.cpu_count() or 1)
+MAX_QUEUED_TASKS = int(os.getenv("MAX_QUEUED_TASKS", "64"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true")
+
+TEMPLATES_PATH = Path(__file__).parent / "templates"
+
 
-templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
+@cache
+def get_templates() -> "Jinja2Templates":
+    """Create the template environment on first use, keeping Jinja2 out of startup."""
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory=str(TEMPLATES_PATH))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting server...")
     app.state.products = init_product_db()
+    DATASET_LOAD_SECONDS.observe(app.state.products.load_seconds, "startup")
+    app.state.response_cache = ResponseCache(
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES,
+        ttl=CACHE_TTL,
+        max_age=CACHE_MAX_AGE,
+    )
+    app.state.executor = BoundedExecutor(
+        max_workers=WORKER_THREADS, max_queued=MAX_QUEUED_TASKS
+    )
+    app.state.admin_token = ADMIN_TOKEN
+
+    watcher = None
+    if RELOAD_INTERVAL > 0:
+        watcher = asyncio.create_task(watch_product_db(app, RELOAD_INTERVAL))
+
     yield
+
     logger.info("Shutting down...")
+    if watcher is not None:
+        watcher.cancel()
 
 
 app = FastAPI(
@@ -36,119 +93,202 @@ app = FastAPI(
 )
 
 app.include_router(products.router)
+app.include_router(admin.router)
+app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    status = "healthy"
-    message = None
-    product_count = 0
-    update_date = "Unknown"
-
-    try:
-        db = request.app.state.products
-        if db is None or db.df is None:
-            status = "unhealthy"
-            message = "Products data not loaded"
-        elif db.df.height == 0:
-            status = "unhealthy"
-            message = "Products data is empty"
-        else:
-            product_count = db.product_count
-            update_date = db.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-    except AttributeError:
-        status = "unhealthy"
-        message = "Application state not initialized"
-
-    return templates.TemplateResponse(
-        request=request,
-        name="health.html",
-        context={
-            "STATUS": status,
-            "VERSION": API_VERSION,
-            "ENVIRONMENT": ENVIRONMENT,
-            "PRODUCT_COUNT": product_count,
-            "UPDATE_DATE": update_date,
-            "MESSAGE": message,
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    return ORJSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
+
+
+def _dataset_status(request: Request) -> tuple[str, str | None]:
+    """Check that the product database is loaded and non-empty."""
+    db = getattr(request.app.state, "products", None)
+    if db is None:
+        return "unhealthy", "Application state not initialized"
+    if db.df is None:
+        return "unhealthy", "Products data not loaded"
+    if db.df.height == 0:
+        return "unhealthy", "Products data is empty"
+    return "healthy", None
+
+
+@app.get("/livez", include_in_schema=False)
+async def livez():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz(request: Request):
+    """Readiness probe: JSON status of the loaded dataset, without rendering."""
+    status, message = _dataset_status(request)
+    if status != "healthy":
+        return ORJSONResponse({"status": status, "message": message}, status_code=503)
+
+    db = request.app.state.products
+    return {
+        "status": status,
+        "version": db.version,
+        "product_count": db.product_count,
+        "updated_at": db.updated_at.isoformat(),
+        "data_age_seconds": round((datetime.now() - db.updated_at).total_seconds()),
+        "indexes": {
+            "search": db.search_index is not None,
+            "id": not db.id_index.is_empty(),
+            "ean": not db.ean_index.is_empty(),
+            "stats": bool(db.stats),
         },
-        status_code=200 if status == "healthy" else 503,
+    }
+
+
+# (metric, type, help, key in the stats dict)
+CACHE_METRICS = (
+    ("response_cache_hits_total", "counter", "Responses served from cache.", "hits"),
+    ("response_cache_misses_total", "counter", "Responses built on a miss.", "misses"),
+    ("response_cache_evictions_total", "counter", "Entries evicted.", "evictions"),
+    ("response_cache_entries", "gauge", "Entries in the cache.", "entries"),
+    ("response_cache_bytes", "gauge", "Bytes of cached bodies.", "bytes"),
+)
+EXECUTOR_METRICS = (
+    ("executor_workers", "gauge", "Worker threads running queries.", "max_workers"),
+    ("executor_pending", "gauge", "Tasks running or queued.", "pending"),
+    ("executor_completed_total", "counter", "Tasks completed.", "completed"),
+    ("executor_rejected_total", "counter", "Tasks rejected as busy.", "rejected"),
+    (
+        "executor_wait_seconds_total",
+        "counter",
+        "Time tasks spent queued for a worker.",
+        "wait_seconds_total",
+    ),
+    (
+        "executor_wait_seconds_max",
+        "gauge",
+        "Longest time a task spent queued.",
+        "wait_seconds_max",
+    ),
+)
+
+
+def _state_metrics(request: Request) -> list[str]:
+    """Dataset, response cache and executor figures, read at scrape time."""
+    state = request.app.state
+    lines = []
+    db = getattr(state, "products", None)
+    if db is not None:
+        for name, documentation, value in (
+            ("dataset_products", "Products in the dataset.", db.product_count),
+            (
+                "dataset_updated_timestamp_seconds",
+                "When the catalog was fetched.",
+                db.updated_at.timestamp(),
+            ),
+            (
+                "dataset_loaded_timestamp_seconds",
+                "When the dataset was loaded.",
+                db.loaded_at.timestamp(),
+            ),
+        ):
+            lines += format_metric(name, "gauge", documentation, [({}, value)])
+
+    for metrics, stats in (
+        (CACHE_METRICS, state.response_cache.stats()),
+        (EXECUTOR_METRICS, state.executor.stats()),
+    ):
+        for name, kind, documentation, key in metrics:
+            lines += format_metric(name, kind, documentation, [({}, stats[key])])
+    return lines
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Request, stage, dataset, cache and executor metrics in Prometheus text format."""
+    lines = REGISTRY.render() + _state_metrics(request)
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
     )
 
 
+@app.get("/", response_class=HTMLResponse)
 @app.get("/health", response_class=HTMLResponse)
 async def health(request: Request):
-    status = "healthy"
-    message = None
-    product_count = 0
-    update_date = "Unknown"
-
-    try:
-        db = request.app.state.products
-        if db is None or db.df is None:
-            status = "unhealthy"
-            message = "Products data not loaded"
-        elif db.df.height == 0:
-            status = "unhealthy"
-            message = "Products data is empty"
-        else:
-            product_count = db.product_count
-            update_date = db.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-    except AttributeError:
-        status = "unhealthy"
-        message = "Application state not initialized"
-
-    return templates.TemplateResponse(
-        request=request,
-        name="health.html",
-        context={
-            "STATUS": status,
-            "VERSION": API_VERSION,
-            "ENVIRONMENT": ENVIRONMENT,
-            "PRODUCT_COUNT": product_count,
-            "UPDATE_DATE": update_date,
-            "MESSAGE": message,
-        },
-        status_code=200 if status == "healthy" else 503,
-    )
+    """Render the status page, reusing the HTML for the current dataset version."""
+    status, message = _dataset_status(request)
+    if status != "healthy":
+        html = (
+            get_templates()
+            .get_template("health.html")
+            .render(
+                STATUS=status,
+                VERSION=API_VERSION,
+                ENVIRONMENT=ENVIRONMENT,
+                PRODUCT_COUNT=0,
+                UPDATE_DATE="Unknown",
+                MESSAGE=message,
+            )
+        )
+        return HTMLResponse(html, status_code=503)
+
+    db = request.app.state.products
+    cached = getattr(request.app.state, "health_page", None)
+    if cached is None or cached[0] != db.version:
+        html = (
+            get_templates()
+            .get_template("health.html")
+            .render(
+                STATUS=status,
+                VERSION=API_VERSION,
+                ENVIRONMENT=ENVIRONMENT,
+                PRODUCT_COUNT=db.product_count,
+                UPDATE_DATE=db.updated_at.strftime("%Y-%m-%d %H:%M:%S"),
+                MESSAGE=None,
+            )
+        )
+        cached = request.app.state.health_page = (db.version, html)
+    return HTMLResponse(cached[1])
 
 
 @app.get("/stats", response_class=HTMLResponse)
 async def stats(request: Request):
-    """Get product statistics page."""
-    df = request.app.state.products.df
+    """Render the product statistics page once per dataset version."""
+    db = request.app.state.products
+    cached = getattr(request.app.state, "stats_page", None)
+    if cached is not None and cached[0] == db.version:
+        return HTMLResponse(cached[1])
 
-    top_types = (
-        df.group_by("Tyyppi").len().sort("len", descending=True).head(5).to_dicts()
-    )
-    top_types = [{"type": item["Tyyppi"], "count": item["len"]} for item in top_types]
-
-    top_countries = (
-        df.group_by("Valmistusmaa")
-        .len()
-        .sort("len", descending=True)
-        .head(5)
-        .to_dicts()
-    )
+    stats = db.stats
+    price = stats["numeric"]["price"]
+    alcohol = stats["numeric"]["alcohol"]
+
+    top_types = [
+        {"type": item["value"], "count": item["count"]}
+        for item in stats["counts"]["product_type"][:5]
+    ]
     top_countries = [
-        {"country": item["Valmistusmaa"], "count": item["len"]}
-        for item in top_countries
+        {"country": item["value"], "count": item["count"]}
+        for item in stats["counts"]["country"][:5]
     ]
 
-    return templates.TemplateResponse(
-        request=request,
-        name="stats.html",
-        context={
-            "TOTAL_PRODUCTS": f"{df.height:,}",
-            "PRICE_MIN": df["Hinta"].min(),
-            "PRICE_MAX": df["Hinta"].max(),
-            "PRICE_AVG": round(df["Hinta"].mean(), 2),
-            "ALCOHOL_MIN": df["Alkoholi-%"].min(),
-            "ALCOHOL_MAX": df["Alkoholi-%"].max(),
-            "ALCOHOL_AVG": round(df["Alkoholi-%"].mean(), 1),
-            "TOP_TYPES": top_types,
-            "TOP_COUNTRIES": top_countries,
-        },
+    html = (
+        get_templates()
+        .get_template("stats.html")
+        .render(
+            TOTAL_PRODUCTS=f"{stats['product_count']:,}",
+            PRICE_MIN=price["min"],
+            PRICE_MAX=price["max"],
+            PRICE_AVG=price["mean"],
+            ALCOHOL_MIN=alcohol["min"],
+            ALCOHOL_MAX=alcohol["max"],
+            ALCOHOL_AVG=round(alcohol["mean"], 1),
+            TOP_TYPES=top_types,
+            TOP_COUNTRIES=top_countries,
+        )
     )
+    request.app.state.stats_page = (db.version, html)
+    return HTMLResponse(html)
 
 
 @app.get("/favicon.svg", include_in_schema=False)
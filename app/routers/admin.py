@@ -0,0 +1,59 @@
+import logging
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+
+from app.schemas.products import ProductDatabase
+from app.services.reload import reload_product_db
+
+logger = logging.getLogger(__file__)
+
+
+def require_admin_token(request: Request, x_admin_token: str | None = Header(None)):
+    """Allow the request only when it carries the configured admin token."""
+    token = request.app.state.admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin_token)],
+    include_in_schema=False,
+)
+
+
+def _dataset_info(db: ProductDatabase) -> dict:
+    return {
+        "version": db.version,
+        "updated_at": db.updated_at.isoformat(),
+        "product_count": db.product_count,
+        "loaded_at": db.loaded_at.isoformat(),
+        "load_seconds": round(db.load_seconds, 3),
+    }
+
+
+@router.get("/dataset")
+async def get_dataset(request: Request):
+    """Get the version and load timing of the active dataset."""
+    return _dataset_info(request.app.state.products)
+
+
+@router.get("/stats")
+async def get_stats(request: Request):
+    """Get response cache and executor counters."""
+    return {
+        "cache": request.app.state.response_cache.stats(),
+        "executor": request.app.state.executor.stats(),
+    }
+
+
+@router.post("/reload")
+async def reload_dataset(request: Request):
+    """Reload the dataset from disk and atomically swap it in."""
+    logger.info("Reload requested.")
+    db = await reload_product_db(request.app)
+    return _dataset_info(db)
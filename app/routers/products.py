@@ -1,11 +1,25 @@
 import logging
+from collections.abc import Callable
+from datetime import datetime
+from typing import Annotated
 
+import orjson
 import polars
-from fastapi import APIRouter, Query, Request
-from pydantic import TypeAdapter
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import Field
 
 import app.services.products as product_service
-from app.schemas.products import Product
+from app.schemas.products import (
+    Product,
+    ProductBatchRequest,
+    ProductDatabase,
+    ProductFilters,
+    SearchPlan,
+)
+from app.services.cache import etag_matches
+from app.services.compression import ENCODERS, is_compressible, negotiate_encoding
+from app.services.metrics import record_rows, stage
 
 logger = logging.getLogger(__file__)
 
@@ -13,110 +27,357 @@ router = APIRouter(
     prefix="/products", tags=["products"], responses={404: {"descirption": "Not found"}}
 )
 
+PRODUCT_SERIALIZERS = {
+    "application/json": product_service.serialize_products,
+    "application/vnd.apache.arrow.stream": product_service.serialize_products_arrow,
+    "application/x-parquet": product_service.serialize_products_parquet,
+}
+
+
+def _negotiate(request: Request) -> str:
+    """Pick the most preferred supported media type from the Accept header."""
+    accepted = []
+    for index, item in enumerate(request.headers.get("accept", "").split(",")):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted.append((-quality, index, media_type))
+
+    for quality, _, media_type in sorted(accepted):
+        if quality < 0 and media_type in PRODUCT_SERIALIZERS:
+            return media_type
+    return "application/json"
+
+
+def _cache_key(request: Request) -> tuple:
+    """Cache key from the path and the sorted, non-empty query parameters."""
+    params = sorted(
+        (key, value)
+        for key, value in request.query_params.multi_items()
+        if value not in ("", "*")
+    )
+    return request.url.path, tuple(params)
+
+
+async def _cached_response(
+    request: Request,
+    build: Callable[[ProductDatabase], bytes | tuple[bytes, dict[str, str]]],
+    media_type: str = "application/json",
+) -> Response:
+    """Serve a response body from the response cache.
+
+    On a miss the body is built in the bounded executor, off the event loop.
+    `build` may also return extra response headers to cache with the body.
+    Cached bodies are compressed in the encoding the client prefers the first
+    time it is asked for, and the compressed copy is cached with the entry, so
+    each body is compressed once per dataset version.
+    """
+    db = request.app.state.products
+    cache = request.app.state.response_cache
+    key = (*_cache_key(request), media_type)
+
+    entry = cache.get(db.version, key)
+    if entry is None:
+        built = await request.app.state.executor.run(build, db)
+        body, extra_headers = built if isinstance(built, tuple) else (built, None)
+        entry = cache.set(db.version, key, body, media_type, extra_headers)
+
+    body, etag = entry.body, entry.etag
+    headers = {
+        **entry.headers,
+        "Cache-Control": f"public, max-age={cache.max_age}",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and is_compressible(body, entry.media_type):
+        encoded = entry.encodings.get(encoding)
+        if encoded is None and cache.holds(db.version, key):
+            encoded = await request.app.state.executor.run(
+                _compress, encoding, entry.body
+            )
+            cache.add_encoding(db.version, key, encoding, encoded)
+        if encoded is not None:
+            body, etag = encoded, f'{etag[:-1]}-{encoding}"'
+            headers["Content-Encoding"] = encoding
+
+    headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=entry.media_type, headers=headers)
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    with stage("compress"):
+        return ENCODERS[encoding](body)
+
+
+async def _cached_products(
+    request: Request, select: Callable[[ProductDatabase], polars.DataFrame]
+) -> Response:
+    """Serve products as JSON, Arrow IPC or Parquet depending on the Accept header."""
+    media_type = _negotiate(request)
+    serialize = PRODUCT_SERIALIZERS[media_type]
+    return await _cached_response(request, lambda db: serialize(select(db)), media_type)
+
+
+class ProductQuery(ProductFilters):
+    """Query string of `/queryProducts`; repeat a filter for several values."""
+
+    limit: int = Field(100, ge=1, description="Max results")
+    sort: str | None = Field(
+        None,
+        description="Comma-separated sort fields, `-` for descending, e.g. "
+        "-price,name. One of: " + ", ".join(product_service.SORT_COLUMNS),
+    )
+    cursor: str | None = Field(
+        None, description="`next_cursor` of the previous page, with the same filters"
+    )
+    facets: str | None = Field(
+        None,
+        description="Comma-separated filter fields to count over all matches, "
+        "e.g. country,product_type",
+    )
+
+
+class ExportQuery(ProductFilters):
+    """Query string of `/export`; repeat a filter for several values."""
+
+    fields: str | None = Field(
+        None, description="Comma-separated fields to include, e.g. name,price"
+    )
+
+
+def _filters(query: ProductFilters) -> dict:
+    """The `search_products` filters of a query model."""
+    return query.model_dump(include=set(ProductFilters.model_fields))
+
 
 @router.get("/", response_model=list[Product])
 async def get_all_products(request: Request):
-    """Get all products."""
+    """Get all products.
+
+    Send `Accept: application/vnd.apache.arrow.stream` or `application/x-parquet`
+    to receive the catalog as Arrow IPC or Parquet instead of JSON.
+    """
     logger.info("Getting all products...")
-    df = request.app.state.products.df
-    adapter = TypeAdapter(list[Product])
-    products = adapter.validate_python(df.to_dicts())
-    return products
+
+    return await _cached_products(request, lambda db: db.df)
+
+
+def _page_headers(next_cursor: str | None, plan: SearchPlan) -> dict[str, str]:
+    """Headers cached with a page: the next cursor and the plan that found it."""
+    headers = {"X-Query-Plan": plan.describe()}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return headers
 
 
 @router.get("/queryProducts")
-async def query_products(
-    request: Request,
-    name: str = None,
-    producer: str = None,
-    product_type: str = None,
-    subtype: str = None,
-    country: str = None,
-    area: str = None,
-    vintage: str = None,
-    grapes: str = None,
-    special_group: str = None,
-    beer_type: str = None,
-    package_type: str = None,
-    closure_type: str = None,
-    assortment: str = None,
-    min_price: float = None,
-    max_price: float = None,
-    min_alcohol: float = None,
-    max_alcohol: float = None,
-    min_sugar: float = None,
-    max_sugar: float = None,
-    limit: int = Query(100, ge=1, description="Max results"),
-):
-    """Query products with extended filtering options."""
+async def query_products(request: Request, query: Annotated[ProductQuery, Query()]):
+    """Query products with extended filtering options.
+
+    String filters match substrings, or whole values, prefixes or exclusions
+    with the `__eq`, `__prefix` and `__not` suffixes, e.g. `country__eq=Ranska`;
+    numeric fields take `min_`/`max_` bounds or exact `__in` values. Repeat a
+    parameter to match any of several values, e.g. `country=Ranska&country=Italia`.
+    Supports the same Arrow IPC and Parquet content negotiation as `/products/`.
+    When more results remain, the cursor of the next page is returned in the
+    `X-Next-Cursor` header. With `facets`, the response is a JSON object holding
+    the products, `next_cursor` and the value counts of the requested fields
+    over every match, not only the page. Send an `X-Debug-Plan` header to get
+    the chosen query plan back in `X-Query-Plan`.
+    """
     logger.info("Querying products...")
-    df = request.app.state.products.df
-    adapter = TypeAdapter(list[Product])
-    results = product_service.search_products(
-        df,
-        name=name,
-        producer=producer,
-        product_type=product_type,
-        subtype=subtype,
-        country=country,
-        area=area,
-        vintage=vintage,
-        grapes=grapes,
-        special_group=special_group,
-        beer_type=beer_type,
-        package_type=package_type,
-        closure_type=closure_type,
-        assortment=assortment,
-        min_price=min_price,
-        max_price=max_price,
-        min_alcohol=min_alcohol,
-        max_alcohol=max_alcohol,
-        min_sugar=min_sugar,
-        max_sugar=max_sugar,
+
+    def page(db: ProductDatabase) -> tuple[polars.DataFrame, dict[str, str]]:
+        results, next_cursor, plan = product_service.search_page(
+            db.df,
+            query,
+            index=db.search_index,
+            limit=query.limit,
+            sort=query.sort,
+            cursor=query.cursor,
+            version=db.version,
+        )
+        record_rows(results.height)
+        return results, _page_headers(next_cursor, plan)
+
+    if query.facets:
+        fields = query.facets.split(",")
+
+        def build(db: ProductDatabase) -> tuple[bytes, dict[str, str]]:
+            products, next_cursor, counts, plan = (
+                product_service.search_page_with_facets(
+                    db.df,
+                    query,
+                    fields,
+                    index=db.search_index,
+                    limit=query.limit,
+                    sort=query.sort,
+                    cursor=query.cursor,
+                    version=db.version,
+                )
+            )
+            record_rows(products.height)
+            body = b'{"products":%s,"facets":%s,"next_cursor":%s}' % (
+                product_service.serialize_products(products),
+                orjson.dumps(counts),
+                orjson.dumps(next_cursor),
+            )
+            return body, _page_headers(next_cursor, plan)
+
+        media_type = "application/json"
+    else:
+        media_type = _negotiate(request)
+        serialize = PRODUCT_SERIALIZERS[media_type]
+
+        def build(db: ProductDatabase) -> tuple[bytes, dict[str, str]]:
+            products, headers = page(db)
+            return serialize(products), headers
+
+    try:
+        response = await _cached_response(request, build, media_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    # The plan that built the body is cached with it, but only shown on request.
+    if not request.headers.get("x-debug-plan") and "x-query-plan" in response.headers:
+        del response.headers["x-query-plan"]
+
+    return response
+
+
+@router.get("/export")
+async def export_products(request: Request, query: Annotated[ExportQuery, Query()]):
+    """Stream matching products as newline-delimited JSON, filtered like `/queryProducts`."""
+    logger.info("Exporting products...")
+    db = request.app.state.products
+
+    columns = None
+    if query.fields:
+        try:
+            columns = product_service.resolve_fields(query.fields.split(","))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+    results = await request.app.state.executor.run(
+        lambda: product_service.search_products(
+            db.df, **_filters(query), index=db.search_index
+        )
+    )
+    record_rows(results.height)
+    return StreamingResponse(
+        product_service.iter_ndjson(results, fields=columns),
+        media_type="application/x-ndjson",
     )
-    results = results.head(limit).to_dicts()
-    products = adapter.validate_python(results)
-    return products
 
 
 @router.get("/productTypes")
 async def get_product_types(request: Request):
     """Get unique product types."""
     logger.info("Getting unique product types.")
-    df = request.app.state.products.df
-    return product_service.get_product_types(df)
+    return await _cached_response(
+        request, lambda db: orjson.dumps(product_service.get_product_types(db.df))
+    )
 
 
 @router.get("/producers")
 async def get_producers(request: Request):
     """Get unique producers, such as vineyards."""
     logger.info("Getting unique producers.")
-    df = request.app.state.products.df
-    return product_service.get_producers(df)
+    return await _cached_response(
+        request, lambda db: orjson.dumps(product_service.get_producers(db.df))
+    )
 
 
 @router.get("/countries")
 async def get_countries(request: Request):
     """Get unique countries of origin."""
     logger.info("Getting unique countries.")
-    df = request.app.state.products.df
-    return product_service.get_countries(df)
+    return await _cached_response(
+        request, lambda db: orjson.dumps(product_service.get_countries(db.df))
+    )
 
 
 @router.get("/areas")
 async def get_areas(request: Request):
     """Get unique areas of origin."""
     logger.info("Getting unique areas.")
-    df = request.app.state.products.df
-    return product_service.get_areas(df)
+    return await _cached_response(
+        request, lambda db: orjson.dumps(product_service.get_areas(db.df))
+    )
 
 
-@router.get("/{product_id}")
+@router.get("/stats")
+async def get_stats(request: Request):
+    """Get catalog counts and price, alcohol and sugar distributions."""
+    logger.info("Getting product statistics.")
+    return await _cached_response(request, lambda db: orjson.dumps(db.stats))
+
+
+@router.get("/changes")
+async def get_changes(
+    request: Request,
+    since: Annotated[
+        datetime | None,
+        Query(
+            description="Only changes recorded after this time, e.g. the "
+            "`changed_at` of the last change already seen"
+        ),
+    ] = None,
+):
+    """Get products added, removed or re-priced between catalog updates."""
+    logger.info(f"Getting product changes since {since}.")
+    return await _cached_response(
+        request,
+        lambda db: product_service.serialize_changes(
+            product_service.get_changes(db.changes, since)
+        ),
+    )
+
+
+@router.post("/batch", response_model=list[Product])
+async def get_products_batch(request: Request, batch: ProductBatchRequest):
+    """Get many products by ID and/or EAN in one request. Unknown codes are skipped."""
+    logger.info(
+        f"Getting {len(batch.product_ids)} products by ID and {len(batch.eans)} by EAN"
+    )
+    db = request.app.state.products
+
+    def build() -> bytes:
+        results = product_service.get_products_by_ids(
+            db, product_ids=batch.product_ids, eans=batch.eans
+        )
+        return product_service.serialize_products(results)
+
+    body = await request.app.state.executor.run(build)
+    return Response(body, media_type="application/json")
+
+
+@router.get("/ean/{ean}", response_model=list[Product])
+async def get_product_by_ean(request: Request, ean: str):
+    """Get products by EAN barcode."""
+    logger.info(f"Getting product by EAN {ean}")
+
+    def build(db: ProductDatabase) -> bytes:
+        results = product_service.get_products_by_ids(db, eans=[ean])
+        return product_service.serialize_products(results)
+
+    return await _cached_response(request, build)
+
+
+@router.get("/{product_id}", response_model=list[Product])
 async def get_product_by_id(request: Request, product_id: str):
     """Get product by ID."""
     logger.info(f"Getting product by ID {product_id}")
-    df = request.app.state.products.df
-    adapter = TypeAdapter(list[Product])
-    results = df.filter(polars.col("Numero").cast(polars.Utf8) == product_id).to_dicts()
-    products = adapter.validate_python(results)
-    return products
+
+    def build(db: ProductDatabase) -> bytes:
+        results = product_service.get_products_by_ids(db, product_ids=[product_id])
+        return product_service.serialize_products(results)
+
+    return await _cached_response(request, build)
@@ -1,10 +1,16 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import get_args, get_origin
 
 import polars
 import pydantic
 from pydantic import Field, computed_field
 
+IMAGE_LINK_TEMPLATE = (
+    "https://images.alko.fi/images/cs_srgb,f_auto,t_medium/cdn/{product_id}/.jpg"
+)
+PRODUCT_LINK_TEMPLATE = "https://www.alko.fi/tuotteet/{product_id}/"
+
 
 class Product(pydantic.BaseModel):
     # Core identification
@@ -45,21 +51,225 @@ class Product(pydantic.BaseModel):
     grapes: str | None = Field(alias="Rypäleet", default=None)
     notes: str | None = Field(alias="Huomautus", default=None)
 
+    # Derived at load time
+    bottle_liters: float | None = Field(alias="Pullokoko l", default=None)
+    alcohol_liters: float | None = Field(alias="Alkoholia l", default=None)
+    price_per_alcohol_liter: float | None = Field(
+        alias="Alkoholilitrahinta", default=None
+    )
+    standard_drinks: float | None = Field(alias="Annokset", default=None)
+    price_per_drink: float | None = Field(alias="Annoshinta", default=None)
+
     @computed_field
     @property
     def image_link(self) -> str:
-        return f"https://images.alko.fi/images/cs_srgb,f_auto,t_medium/cdn/{self.product_id}/.jpg"
+        return IMAGE_LINK_TEMPLATE.format(product_id=self.product_id)
 
     @computed_field
     @property
     def link(self) -> str:
-        return f"https://www.alko.fi/tuotteet/{self.product_id}/"
+        return PRODUCT_LINK_TEMPLATE.format(product_id=self.product_id)
 
     model_config = pydantic.ConfigDict(populate_by_name=True)
 
 
+# Filter fields and the product columns they match.
+STRING_FILTERS = {
+    "name": "Nimi",
+    "producer": "Valmistaja",
+    "product_type": "Tyyppi",
+    "subtype": "Alatyyppi",
+    "country": "Valmistusmaa",
+    "area": "Alue",
+    "vintage": "Vuosikerta",
+    "grapes": "Rypäleet",
+    "special_group": "Erityisryhmä",
+    "beer_type": "Oluttyyppi",
+    "package_type": "Pakkaustyyppi",
+    "closure_type": "Suljentatyyppi",
+    "assortment": "Valikoima",
+}
+RANGE_FILTERS = {
+    "price": "Hinta",
+    "alcohol": "Alkoholi-%",
+    "sugar": "Sokeri g/l",
+    "liters": "Pullokoko l",
+    "price_per_alcohol_liter": "Alkoholilitrahinta",
+    "price_per_drink": "Annoshinta",
+}
+# Filter modes; a string field without one matches substrings.
+STRING_OPERATORS = ("", "eq", "prefix", "not")
+RANGE_OPERATORS = ("min", "max", "in")
+
+
+def filter_name(field: str, operator: str = "") -> str:
+    """Parameter name of a filter field in a mode, e.g. `country__eq` or `min_price`."""
+    if operator in ("min", "max"):
+        return f"{operator}_{field}"
+    return f"{field}__{operator}" if operator else field
+
+
+class _FilterOptions(pydantic.BaseModel):
+    """Free-text options of `ProductFilters`, which adds the generated fields."""
+
+    q: str | None = Field(
+        None,
+        description="Typo-tolerant free text over name, producer and description, "
+        "ranked by similarity",
+    )
+    fuzzy: bool = Field(False, description="Match `name` like `q` instead of exactly")
+
+    @pydantic.model_validator(mode="before")
+    @classmethod
+    def reject_unknown_filters(cls, data):
+        """Reject misspelled filters like `country__eqq`; other extra names are ignored."""
+        if isinstance(data, dict):
+            unknown = sorted(
+                name
+                for name in data
+                if name not in cls.model_fields
+                and ("__" in name or name.startswith(("min_", "max_")))
+            )
+            if unknown:
+                raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+        return data
+
+    @pydantic.field_validator("*", mode="before")
+    @classmethod
+    def wrap_single_value(cls, value, info: pydantic.ValidationInfo):
+        """Accept a single value for list filters, e.g. `country="Ranska"`."""
+        annotation = cls.model_fields[info.field_name].annotation
+        if isinstance(value, str | int | float) and any(
+            get_origin(arg) is list for arg in get_args(annotation)
+        ):
+            return [value]
+        return value
+
+
+ProductFilters = pydantic.create_model(
+    "ProductFilters",
+    __base__=_FilterOptions,
+    __module__=__name__,
+    __doc__="""Search filters; filters on different fields must all match.
+
+    String filters take one or more values and match any of them, case- and
+    accent-insensitively: a plain field as a substring, `__eq` as the whole
+    value and `__prefix` as its start, while `__not` excludes substring
+    matches. Numeric fields take `min_`/`max_` bounds or an `__in` set of
+    exact values. The fields are generated from `STRING_FILTERS`,
+    `RANGE_FILTERS` and their operators.
+    """,
+    **{
+        filter_name(field, operator): (list[str] | None, None)
+        for field in STRING_FILTERS
+        for operator in STRING_OPERATORS
+    },
+    **{
+        filter_name(field, operator): (
+            list[float] | None if operator == "in" else float | None,
+            None,
+        )
+        for field in RANGE_FILTERS
+        for operator in RANGE_OPERATORS
+    },
+)
+
+
+class ProductBatchRequest(pydantic.BaseModel):
+    product_ids: list[str] = Field(default_factory=list, max_length=1000)
+    eans: list[str] = Field(default_factory=list, max_length=1000)
+
+
+@dataclass
+class FuzzyIndex:
+    """Trigram postings over the vocabulary of the free-text columns.
+
+    Word ids index `words`, `gram_counts`, `rows` and `weights`.
+    """
+
+    words: list[str]
+    gram_counts: list[int]
+    grams: dict[str, list[int]]
+    rows: list[list[int]]
+    weights: list[list[float]]
+
+
+@dataclass
+class SearchIndex:
+    """Normalized copies of the filter columns and their token postings."""
+
+    normalized: polars.DataFrame
+    tokens: dict[str, polars.DataFrame]
+    sorted_values: dict[str, polars.Series]
+    ranks: polars.DataFrame
+    fuzzy: FuzzyIndex | None = None
+
+
+@dataclass
+class SearchPredicate:
+    column: str
+    label: str
+    expr: polars.Expr
+    selectivity: float
+    cost: float
+
+    @property
+    def rank(self) -> float:
+        """Lower ranks run first: cheap predicates that discard many rows."""
+        return self.cost / max(1.0 - self.selectivity, 1e-9)
+
+
+@dataclass
+class SearchPlan:
+    total_rows: int
+    candidates: list[int] | None
+    index_columns: list[str]
+    predicates: list[SearchPredicate]
+    limit: int | None
+    sort: list[tuple[str, bool]] = field(default_factory=list)
+    after: list[int] | None = None
+
+    @property
+    def estimated_rows(self) -> int:
+        rows = self.total_rows if self.candidates is None else len(self.candidates)
+        for predicate in self.predicates:
+            rows *= predicate.selectivity
+        return round(rows if self.limit is None else min(rows, self.limit))
+
+    def describe(self) -> str:
+        steps = []
+        if self.candidates is not None:
+            columns = ",".join(self.index_columns)
+            steps.append(f"index({columns}) rows={len(self.candidates)}")
+        else:
+            steps.append(f"scan rows={self.total_rows}")
+        steps.extend(
+            f"filter {predicate.label} sel={predicate.selectivity:.2f}"
+            for predicate in self.predicates
+        )
+        if self.after is not None:
+            steps.append("after cursor")
+        if self.sort:
+            keys = ",".join(
+                f"{name} desc" if descending else name for name, descending in self.sort
+            )
+            steps.append(f"top_k({keys})" if self.limit is not None else f"sort {keys}")
+        if self.limit is not None:
+            steps.append(f"limit {self.limit}")
+        steps.append(f"est_rows={self.estimated_rows}")
+        return "; ".join(steps)
+
+
 @dataclass
 class ProductDatabase:
     df: polars.DataFrame
     updated_at: datetime
+    version: str
     product_count: int
+    search_index: SearchIndex
+    id_index: polars.DataFrame
+    ean_index: polars.DataFrame
+    stats: dict
+    loaded_at: datetime
+    load_seconds: float
+    changes: polars.DataFrame | None = None
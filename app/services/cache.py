@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    media_type: str
+    created_at: float
+    headers: dict[str, str] = field(default_factory=dict)
+    # content coding -> compressed body
+    encodings: dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(map(len, self.encodings.values()))
+
+
+class ResponseCache:
+    """In-process LRU/TTL cache of serialized responses for one dataset version.
+
+    The cache serves the version it was last cleared for, or else the first one
+    it sees. Requests still running on another version, such as the previous
+    snapshot during a reload, miss and store nothing, so they cannot evict the
+    entries of the current one.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600,
+        max_age: int = 3600,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_age = max_age
+        self.version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, version: str, key: Hashable) -> CachedResponse | None:
+        """Return a fresh cached response, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key) if self._is_current(version) else None
+            if entry is not None and time.monotonic() - entry.created_at > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(
+        self,
+        version: str,
+        key: Hashable,
+        body: bytes,
+        media_type: str = "application/json",
+        headers: dict[str, str] | None = None,
+    ) -> CachedResponse:
+        """Store a serialized body and its extra headers, and return the entry."""
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        entry = CachedResponse(
+            body=body,
+            etag=f'"{version}-{digest}"',
+            media_type=media_type,
+            created_at=time.monotonic(),
+            headers=headers or {},
+        )
+        if len(body) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if not self._is_current(version):
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def holds(self, version: str, key: Hashable) -> bool:
+        """Check whether an entry is cached for this version, without touching it."""
+        with self._lock:
+            return version == self.version and key in self._entries
+
+    def add_encoding(self, version: str, key: Hashable, encoding: str, body: bytes):
+        """Keep a compressed copy of a cached entry, counted towards `max_bytes`.
+
+        Does nothing when the entry has been evicted in the meantime.
+        """
+        with self._lock:
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None or encoding in entry.encodings:
+                return
+            entry.encodings[encoding] = body
+            self._size += len(body)
+            while self._entries and self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self, version: str | None = None):
+        """Drop every entry and serve `version` from now on, or the next one seen."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.version = version
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _is_current(self, version: str) -> bool:
+        if self.version is None:
+            self.version = version
+        return version == self.version
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
@@ -0,0 +1,64 @@
+import gzip
+from collections.abc import Callable
+
+import brotli
+import zstandard
+
+# Bodies smaller than this are sent as is; compressing them saves too little.
+MIN_COMPRESS_BYTES = 1024
+# Parquet bodies are already compressed internally.
+COMPRESSIBLE_TYPES = {"application/json", "application/vnd.apache.arrow.stream"}
+# Preferred first when a client accepts several encodings equally.
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=9)
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=12).compress(body)
+
+
+# Levels favour ratio, as each body is compressed once per dataset version,
+# but stay well below a second for the full catalog.
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": _gzip,
+    "br": _brotli,
+    "zstd": _zstd,
+}
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Pick the supported content coding a client prefers, or None for identity."""
+    if not accept_encoding:
+        return None
+
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(coding, wildcard), -rank, coding)
+        for rank, coding in enumerate(PREFERENCE)
+        if coding in ENCODERS
+    ]
+    quality, _, coding = max(candidates)
+    return coding if quality > 0 else None
+
+
+def is_compressible(body: bytes, media_type: str) -> bool:
+    return len(body) >= MIN_COMPRESS_BYTES and media_type in COMPRESSIBLE_TYPES
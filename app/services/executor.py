@@ -0,0 +1,68 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+import anyio
+import anyio.to_thread
+
+from app.services.metrics import record_stage
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the executor queue is full."""
+
+
+class BoundedExecutor:
+    """Run blocking calls in worker threads with a concurrency cap and a bounded queue.
+
+    Polars releases the GIL while it filters and serializes, so running the
+    service calls here keeps the event loop free and lets queries use all cores.
+    Counters are only touched from the event loop thread.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.limiter = anyio.CapacityLimiter(max_workers)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_workers + self.max_queued:
+            self.rejected += 1
+            raise ExecutorBusyError("Too many queued requests")
+
+        started = None
+
+        def call():
+            nonlocal started
+            started = time.perf_counter()
+            return func(*args)
+
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            return await anyio.to_thread.run_sync(call, limiter=self.limiter)
+        finally:
+            self.pending -= 1
+            # Failed calls count too; one cancelled while queued never started.
+            if started is not None:
+                wait = started - submitted
+                record_stage("queue", wait)
+                self.completed += 1
+                self.wait_seconds_total += wait
+                self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
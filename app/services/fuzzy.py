@@ -0,0 +1,131 @@
+import heapq
+from collections import Counter
+
+import polars
+
+from app.schemas.products import FuzzyIndex
+
+# Minimum trigram similarity for a word to count as a match of a query word.
+MIN_SIMILARITY = 0.3
+# Most similar vocabulary words expanded into rows for each query word.
+MAX_WORDS = 64
+# Query words considered; the rest of a long query is ignored.
+MAX_QUERY_WORDS = 8
+
+
+def trigrams(word: str) -> set[str]:
+    """Trigrams of a word padded like pg_trgm, so short words still have some."""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def build_fuzzy_index(words: polars.DataFrame, weights: dict[str, float]) -> FuzzyIndex:
+    """Build a trigram index over the words of the given text columns.
+
+    `words` holds one list of normalized words per row and column, and `weights`
+    says how much a match in each column counts towards a row's score.
+    """
+    postings = (
+        polars.concat(
+            words.select(
+                polars.int_range(polars.len(), dtype=polars.UInt32).alias("row"),
+                polars.col(column).alias("word"),
+                polars.lit(weight, dtype=polars.Float32).alias("weight"),
+            )
+            for column, weight in weights.items()
+        )
+        .explode("word")
+        .drop_nulls("word")
+        .group_by("word", "row")
+        .agg(polars.col("weight").max())
+        .group_by("word")
+        .agg("row", "weight")
+        .sort("word")
+    )
+
+    vocabulary = postings["word"].to_list()
+    grams: dict[str, list[int]] = {}
+    gram_counts = []
+    for word_id, word in enumerate(vocabulary):
+        word_grams = trigrams(word)
+        gram_counts.append(len(word_grams))
+        for gram in word_grams:
+            grams.setdefault(gram, []).append(word_id)
+
+    return FuzzyIndex(
+        words=vocabulary,
+        gram_counts=gram_counts,
+        grams=grams,
+        rows=postings["row"].to_list(),
+        weights=postings["weight"].to_list(),
+    )
+
+
+def fuzzy_search(index: FuzzyIndex, words: list[str], limit: int) -> list[int]:
+    """Rank rows by trigram similarity to the query words, best first.
+
+    Each query word is matched against the vocabulary, not the rows, and only
+    its `MAX_WORDS` most similar words are expanded into rows, so the cost per
+    query is bounded by the vocabulary size. A row scores the weighted
+    similarity of its best matching word for every query word.
+    """
+    scores: Counter[int] = Counter()
+    for word in words[:MAX_QUERY_WORDS]:
+        word_grams = trigrams(word)
+        shared: Counter[int] = Counter()
+        for gram in word_grams:
+            shared.update(index.grams.get(gram, ()))
+
+        matches = []
+        for word_id, count in shared.items():
+            similarity = count / (len(word_grams) + index.gram_counts[word_id] - count)
+            if similarity >= MIN_SIMILARITY:
+                matches.append((similarity, word_id))
+
+        best: dict[int, float] = {}
+        for similarity, word_id in heapq.nlargest(MAX_WORDS, matches):
+            for row, weight in zip(
+                index.rows[word_id], index.weights[word_id], strict=True
+            ):
+                score = similarity * weight
+                if score > best.get(row, 0.0):
+                    best[row] = score
+        scores.update(best)
+
+    ranked = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [row for row, _ in ranked]
+
+
+def fuzzy_index_frames(index: FuzzyIndex) -> dict[str, polars.DataFrame]:
+    """Store the index as frames that can be written to the snapshot."""
+    return {
+        "fuzzy_words": polars.DataFrame(
+            {
+                "word": index.words,
+                "gram_count": index.gram_counts,
+                "rows": index.rows,
+                "weights": index.weights,
+            },
+            schema={
+                "word": polars.Utf8,
+                "gram_count": polars.UInt16,
+                "rows": polars.List(polars.UInt32),
+                "weights": polars.List(polars.Float32),
+            },
+        ),
+        "fuzzy_grams": polars.DataFrame(
+            {"gram": list(index.grams), "words": list(index.grams.values())},
+            schema={"gram": polars.Utf8, "words": polars.List(polars.UInt32)},
+        ),
+    }
+
+
+def load_fuzzy_index(words: polars.DataFrame, grams: polars.DataFrame) -> FuzzyIndex:
+    """Rebuild the index from its snapshot frames, without re-tokenizing rows."""
+    return FuzzyIndex(
+        words=words["word"].to_list(),
+        gram_counts=words["gram_count"].to_list(),
+        grams=dict(zip(grams["gram"].to_list(), grams["words"].to_list(), strict=True)),
+        rows=words["rows"].to_list(),
+        weights=words["weights"].to_list(),
+    )
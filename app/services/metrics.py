@@ -0,0 +1,258 @@
+import math
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+ROW_BUCKETS = (0, 1, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"'
+        for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_metric(
+    name: str,
+    kind: str,
+    documentation: str,
+    samples: Iterable[tuple[dict[str, str], float]],
+) -> list[str]:
+    """Render a gauge or counter read at scrape time in Prometheus text format."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels, labels.values())} {_number(value)}")
+    return lines
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of label names."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = (*buckets, math.inf)
+        # label values -> (bucket counts, sum)
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = ([0] * len(self.buckets), [0.0])
+            counts, total = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(
+                (values, list(counts), total[0])
+                for values, (counts, total) in self._series.items()
+            )
+        for values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                labels = _labels((*self.labelnames, "le"), (*values, _number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """The histograms recorded by this process."""
+
+    def __init__(self):
+        self.metrics: list[Histogram] = []
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> list[str]:
+        return [line for metric in self.metrics for line in metric.render()]
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by route.",
+    ("method", "endpoint", "status"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "request_stage_duration_seconds",
+    "Time spent in each stage of serving a request, by route.",
+    ("endpoint", "stage"),
+)
+RESULT_ROWS = REGISTRY.histogram(
+    "search_result_rows",
+    "Products returned per search, by route.",
+    ("endpoint",),
+    buckets=ROW_BUCKETS,
+)
+DATASET_LOAD_SECONDS = REGISTRY.histogram(
+    "dataset_load_duration_seconds",
+    "Time to load the product dataset, at startup or on reload.",
+    ("trigger",),
+    buckets=LOAD_BUCKETS,
+)
+
+
+@dataclass
+class RequestTimings:
+    """Stage durations and result size recorded while serving one request."""
+
+    stages: dict[str, float] = field(default_factory=dict)
+    rows: int | None = None
+
+    def server_timing(self, total: float) -> str:
+        """Format the stages as a `Server-Timing` header value, in milliseconds."""
+        entries = [*self.stages.items(), ("total", total)]
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in entries
+        )
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(name: str, seconds: float):
+    """Add time spent in a stage to the current request, if there is one.
+
+    The context is copied into worker threads, so services can record stages
+    while they run in the executor. Outside a request this does nothing.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.stages[name] = timings.stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as a stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_rows(rows: int):
+    """Record how many products the current request returns."""
+    timings = _current.get()
+    if timings is not None:
+        timings.rows = rows
+
+
+class MetricsMiddleware:
+    """Record request and stage durations, labeled by the matched route.
+
+    Routes are labeled by their path template, so `/products/{product_id}` is
+    one series however many products are requested. With `server_timing`, or
+    when a request sends `X-Debug-Timing`, the stage durations are also
+    returned in a `Server-Timing` header.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+        debug = self.server_timing or any(
+            name == b"x-debug-timing" for name, _ in scope["headers"]
+        )
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    value = timings.server_timing(time.perf_counter() - start)
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (b"server-timing", value.encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], endpoint, str(status)
+            )
+            for name, seconds in timings.stages.items():
+                STAGE_SECONDS.observe(seconds, endpoint, name)
+            if timings.rows is not None:
+                RESULT_ROWS.observe(timings.rows, endpoint)
@@ -1,21 +1,461 @@
+import base64
+import binascii
+import hashlib
+import io
 import json
 import logging
+import re
+import time
+import unicodedata
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
 from datetime import datetime
 from functools import reduce
 from pathlib import Path
 
 import polars
 
-from app.schemas.products import ProductDatabase
+from app.schemas.products import (
+    IMAGE_LINK_TEMPLATE,
+    PRODUCT_LINK_TEMPLATE,
+    RANGE_FILTERS,
+    STRING_FILTERS,
+    STRING_OPERATORS,
+    FuzzyIndex,
+    Product,
+    ProductDatabase,
+    ProductFilters,
+    SearchIndex,
+    SearchPlan,
+    SearchPredicate,
+    filter_name,
+)
+from app.services.fuzzy import (
+    build_fuzzy_index,
+    fuzzy_index_frames,
+    fuzzy_search,
+    load_fuzzy_index,
+)
+from app.services.metrics import stage
+from app.services.snapshot import read_manifest, read_snapshot, write_snapshot
+from app.services.stats import compute_stats, facet_counts
 
 logger = logging.getLogger(__name__)
 
 DATA_PATH = Path(__file__).parent.parent.parent / "data"
+SNAPSHOT_PATH = DATA_PATH / "snapshot"
+CHANGES_PATH = DATA_PATH / "changes.parquet"
+
+# Bump whenever the prepared frame or the index layout changes, so snapshots
+# written by older code are rebuilt instead of loaded.
+SNAPSHOT_FORMAT = 5
+
+SEARCH_COLUMNS = tuple(STRING_FILTERS.values())
+
+# Fields `sort` accepts and the columns they order by.
+SORT_COLUMNS = {
+    "price": "Hinta",
+    "price_per_liter": "Litrahinta",
+    "alcohol": "Alkoholi-%",
+    "sugar": "Sokeri g/l",
+    "vintage": "Vuosikerta",
+    "name": "Nimi",
+    "liters": "Pullokoko l",
+    "price_per_alcohol_liter": "Alkoholilitrahinta",
+    "standard_drinks": "Annokset",
+    "price_per_drink": "Annoshinta",
+}
+
+STATS_COUNT_FIELDS = {
+    field: STRING_FILTERS[field] for field in ("product_type", "country", "area")
+}
+
+CATEGORICAL_COLUMNS = (
+    "Tyyppi",
+    "Alatyyppi",
+    "Oluttyyppi",
+    "Erityisryhmä",
+    "Valmistusmaa",
+    "Alue",
+    "Pullokoko",
+    "Pakkaustyyppi",
+    "Suljentatyyppi",
+    "Valikoima",
+)
+
+# Relative per-row cost of evaluating a predicate, used to order the plan.
+RANGE_COST = 1.0
+MEMBERSHIP_COST = 1.0
+PREFIX_COST = 2.0
+SUBSTRING_COST = 4.0
+STRING_COSTS = {
+    "": SUBSTRING_COST,
+    "eq": MEMBERSHIP_COST,
+    "prefix": PREFIX_COST,
+    "not": SUBSTRING_COST,
+}
+# Assumed share of rows an excluded substring leaves in.
+NEGATION_SELECTIVITY = 0.9
+
+TOKEN_PATTERN = r"\w+"
+
+# Liters per unit of the bottle sizes in `Pullokoko`, e.g. "0.75 l".
+VOLUME_UNITS = {"l": 1.0, "cl": 0.01, "ml": 0.001}
+# Grams of ethanol per liter of pure alcohol, and per Finnish standard drink.
+ETHANOL_DENSITY = 789.0
+STANDARD_DRINK_GRAMS = 12.0
+
+# Free-text columns behind `q` and how much a match in each one counts.
+FUZZY_WEIGHTS = {"Nimi": 1.0, "Valmistaja": 0.8, "Luonnehdinta": 0.5}
+# Ranked rows kept from a fuzzy query before the other filters run.
+FUZZY_CANDIDATES = 1000
+
+FIELD_DTYPES = {
+    str: polars.Utf8,
+    str | None: polars.Utf8,
+    float | None: polars.Float64,
+    int | None: polars.Int64,
+    bool: polars.Boolean,
+}
+
+COMPUTED_LINK_TEMPLATES = {
+    "image_link": IMAGE_LINK_TEMPLATE,
+    "link": PRODUCT_LINK_TEMPLATE,
+}
+
+
+def _build_fold_table() -> dict[str, str]:
+    """Map accented lowercase Latin characters to their ASCII base letters."""
+    table = {}
+    for codepoint in range(0xC0, 0x250):
+        char = chr(codepoint)
+        if char != char.lower():
+            continue
+        base = "".join(
+            c
+            for c in unicodedata.normalize("NFKD", char)
+            if not unicodedata.combining(c)
+        )
+        if base != char and base.isascii():
+            table[char] = base
+    table.update({"ß": "ss", "æ": "ae", "ø": "o", "œ": "oe", "ł": "l", "đ": "d"})
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+_FOLD_TRANSLATION = str.maketrans(FOLD_TABLE)
+
+
+def normalize_text(value: str) -> str:
+    """Lowercase and accent-fold a search term."""
+    return value.lower().translate(_FOLD_TRANSLATION)
+
+
+def normalize_expr(column: str) -> polars.Expr:
+    """Lowercase and accent-fold a column the same way as `normalize_text`."""
+    return (
+        polars.col(column)
+        .cast(polars.Utf8)
+        .fill_null("")
+        .str.to_lowercase()
+        .str.replace_many(list(FOLD_TABLE), list(FOLD_TABLE.values()))
+    )
+
+
+def add_derived_columns(df: polars.DataFrame) -> polars.DataFrame:
+    """Add value-for-money metrics computed from the size, price and strength.
+
+    `Pullokoko` is parsed into liters, and from that the liters of pure
+    alcohol, the Finnish standard drinks (12 g of ethanol) in the package and
+    the price per liter of pure alcohol and per drink. Metrics that would
+    divide by zero, such as those of alcohol-free drinks, are null.
+    """
+    size = (
+        polars.col("Pullokoko")
+        .cast(polars.Utf8)
+        .str.extract_groups(r"(?i)([\d.,]+)\s*(ml|cl|l)\b")
+    )
+    liters = size.struct[0].str.replace(",", ".").cast(
+        polars.Float64, strict=False
+    ) * size.struct[1].str.to_lowercase().replace_strict(
+        VOLUME_UNITS, default=None, return_dtype=polars.Float64
+    )
+    alcohol_liters = liters * polars.col("Alkoholi-%") / 100
+    drinks = alcohol_liters * ETHANOL_DENSITY / STANDARD_DRINK_GRAMS
+    positive = polars.col("Alkoholi-%") > 0
+
+    return df.with_columns(
+        liters.round(4).alias("Pullokoko l"),
+        alcohol_liters.round(4).alias("Alkoholia l"),
+        polars.when(positive)
+        .then(polars.col("Hinta") / alcohol_liters)
+        .round(2)
+        .alias("Alkoholilitrahinta"),
+        drinks.round(1).alias("Annokset"),
+        polars.when(positive)
+        .then(polars.col("Hinta") / drinks)
+        .round(2)
+        .alias("Annoshinta"),
+    )
+
+
+def optimize_schema(df: polars.DataFrame) -> polars.DataFrame:
+    """Shrink the product frame for serving.
+
+    Columns the API neither serves nor filters on are dropped, low-cardinality
+    strings become enums and integers are downcast. Floats are left at 64 bits
+    so serialized prices stay exactly as in the source data.
+    """
+    used = {field.alias for field in Product.model_fields.values()}
+    used.update(SEARCH_COLUMNS, RANGE_FILTERS.values())
+    df = df.select(column for column in df.columns if column in used)
+    return df.with_columns(
+        *(
+            polars.col(column).cast(
+                polars.Enum(df[column].drop_nulls().unique().sort())
+            )
+            for column in CATEGORICAL_COLUMNS
+        ),
+        *(
+            df[column].shrink_dtype()
+            for column, dtype in df.schema.items()
+            if dtype.is_integer()
+        ),
+    )
+
+
+def build_search_index(df: polars.DataFrame) -> SearchIndex:
+    """Precompute normalized filter columns and a token to row-id inverted index."""
+    normalized = df.select(normalize_expr(column) for column in SEARCH_COLUMNS)
+    tokens = {
+        column: normalized.select(
+            polars.col(column).str.extract_all(TOKEN_PATTERN).alias("token")
+        )
+        .with_row_index("row")
+        .explode("token")
+        .drop_nulls("token")
+        .group_by("token")
+        .agg(polars.col("row").unique())
+        for column in SEARCH_COLUMNS
+    }
+    sorted_values = {
+        column: df[column].drop_nulls().sort() for column in RANGE_FILTERS.values()
+    }
+    return SearchIndex(
+        normalized=normalized,
+        tokens=tokens,
+        sorted_values=sorted_values,
+        ranks=build_sort_ranks(df),
+    )
+
+
+def build_sort_ranks(df: polars.DataFrame) -> polars.DataFrame:
+    """Dense rank of every row in each sortable column, keyed by field name.
+
+    Ordering by these integers gives the same order as the values themselves,
+    with names compared accent- and case-insensitively. Nulls rank last, as the
+    row count.
+    """
+
+    def sort_value(column: str) -> polars.Expr:
+        if df.schema[column].is_numeric():
+            return polars.col(column)
+        # Normalizing fills nulls with "", which would rank them first.
+        return polars.when(polars.col(column).is_not_null()).then(
+            normalize_expr(column)
+        )
+
+    return df.select(
+        (
+            sort_value(column)
+            .rank("dense")
+            .cast(polars.UInt32)
+            .sub(1)
+            .fill_null(polars.len())
+            .alias(name)
+        )
+        for name, column in SORT_COLUMNS.items()
+    )
+
+
+def build_text_index(df: polars.DataFrame) -> FuzzyIndex:
+    """Build the trigram index behind typo-tolerant `q` searches."""
+    words = df.select(
+        normalize_expr(column).str.extract_all(TOKEN_PATTERN)
+        for column in FUZZY_WEIGHTS
+    )
+    return build_fuzzy_index(words, FUZZY_WEIGHTS)
+
+
+def build_lookup_index(df: polars.DataFrame, column: str) -> polars.DataFrame:
+    """Pair each value of a column with the rows holding it, sorted by value.
+
+    Lookups binary search the sorted values, so the index is used straight
+    from the memory-mapped snapshot instead of being rebuilt as a dict.
+    """
+    return (
+        df.select(polars.col(column).cast(polars.Utf8).alias("value"))
+        .with_row_index("row")
+        .drop_nulls("value")
+        .sort("value", "row")
+        .select("value", "row")
+    )
+
+
+def lookup_rows(index: polars.DataFrame, values: Sequence[str]) -> list[int]:
+    """Rows holding each of the values, in the order of `values`."""
+    if not values:
+        return []
+    probe = polars.Series(values, dtype=polars.Utf8)
+    starts = index["value"].search_sorted(probe, side="left").to_list()
+    ends = index["value"].search_sorted(probe, side="right").to_list()
+    rows = index["row"]
+    return [
+        row
+        for start, end in zip(starts, ends, strict=True)
+        for row in rows.slice(start, end - start).to_list()
+    ]
+
+
+def _candidate_rows(index: SearchIndex, column: str, term: str) -> set[int] | None:
+    """Rows whose tokens can contain every token of the normalized term.
+
+    Returns None when the term has no tokens and cannot narrow the search.
+    """
+    vocabulary = index.tokens[column]
+    rows = None
+    for token in re.findall(TOKEN_PATTERN, term):
+        matches = vocabulary.filter(
+            polars.col("token").str.contains(token, literal=True)
+        )
+        token_rows = set(matches["row"].explode().to_list())
+        rows = token_rows if rows is None else rows & token_rows
+        if not rows:
+            break
+    return rows
+
+
+def _candidate_rows_any(
+    index: SearchIndex, column: str, terms: Sequence[str]
+) -> set[int] | None:
+    """Rows that can contain any of the normalized terms, or None if unknown."""
+    rows = set()
+    for term in terms:
+        term_rows = _candidate_rows(index, column, term)
+        if term_rows is None:
+            return None
+        rows |= term_rows
+    return rows
+
+
+def dataset_version(updated_at: datetime) -> str:
+    """Derive a compact dataset version string from the update timestamp."""
+    return updated_at.strftime("%Y%m%d%H%M%S")
+
+
+def dataset_signature() -> tuple[float, ...]:
+    """Modification times of the data files, used to detect a new dataset."""
+    return tuple(
+        path.stat().st_mtime if path.exists() else 0.0
+        for path in (DATA_PATH / "products.parquet", DATA_PATH / "metadata.json")
+    )
+
+
+def _stack_by_column(frames: dict[str, polars.DataFrame]) -> polars.DataFrame:
+    """Stack per-column frames into one frame keyed by a `column` column."""
+    return polars.concat(
+        frame.select(polars.lit(column).alias("column"), polars.all())
+        for column, frame in frames.items()
+    )
+
+
+def _split_by_column(frame: polars.DataFrame) -> dict[str, polars.DataFrame]:
+    """Undo `_stack_by_column` with zero-copy slices of the stacked frame."""
+    frames = {}
+    offset = 0
+    for column, length in frame.group_by("column", maintain_order=True).len().rows():
+        frames[column] = frame.slice(offset, length).drop("column")
+        offset += length
+    return frames
+
+
+def _snapshot_frames(
+    df: polars.DataFrame,
+    search_index: SearchIndex,
+    id_index: polars.DataFrame,
+    ean_index: polars.DataFrame,
+) -> dict[str, polars.DataFrame]:
+    sorted_values = {
+        column: values.cast(polars.Float64).to_frame("value")
+        for column, values in search_index.sorted_values.items()
+    }
+    return {
+        "products": df,
+        "normalized": search_index.normalized,
+        "tokens": _stack_by_column(search_index.tokens),
+        "sorted_values": _stack_by_column(sorted_values),
+        "ranks": search_index.ranks,
+        "ids": id_index,
+        "eans": ean_index,
+        **fuzzy_index_frames(search_index.fuzzy),
+    }
+
+
+def _load_snapshot(signature: tuple[float, ...]) -> tuple | None:
+    """Memory-map the prepared frame and indexes if the snapshot is fresh.
+
+    Only the fuzzy index is converted back to Python lists; the statistics
+    come from the manifest.
+    """
+    manifest = read_manifest(SNAPSHOT_PATH)
+    if (
+        manifest is None
+        or manifest.get("format") != SNAPSHOT_FORMAT
+        or manifest.get("signature") != list(signature)
+    ):
+        return None
+
+    frames = read_snapshot(SNAPSHOT_PATH, manifest)
+    search_index = SearchIndex(
+        normalized=frames["normalized"],
+        tokens=_split_by_column(frames["tokens"]),
+        sorted_values={
+            column: frame.to_series()
+            for column, frame in _split_by_column(frames["sorted_values"]).items()
+        },
+        ranks=frames["ranks"],
+        fuzzy=load_fuzzy_index(frames["fuzzy_words"], frames["fuzzy_grams"]),
+    )
+    return (
+        frames["products"],
+        search_index,
+        frames["ids"],
+        frames["eans"],
+        manifest["stats"],
+    )
+
+
+@contextmanager
+def _timed(phases: dict[str, float], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
 
 
 def init_product_db() -> ProductDatabase:
-    """Load the pre-fetched product database with metadata."""
+    """Load the pre-fetched product database with metadata.
+
+    The prepared frame, its indexes and statistics are memory-mapped from the
+    Arrow IPC snapshot in `data/snapshot` when it matches the current data
+    files, so uvicorn workers share the same pages and start without
+    re-reading the parquet file. Otherwise they are built from the parquet
+    file and the snapshot is rewritten. The time of each phase is logged.
+    """
     logger.info("Loading product database...")
+    start = time.perf_counter()
+    phases: dict[str, float] = {}
 
     parquet_path = DATA_PATH / "products.parquet"
     metadata_path = DATA_PATH / "metadata.json"
@@ -26,7 +466,42 @@ def init_product_db() -> ProductDatabase:
             "Run 'uv run python -m scraper.fetch_products' first."
         )
 
-    df = polars.read_parquet(parquet_path)
+    signature = dataset_signature()
+    with _timed(phases, "snapshot"):
+        snapshot = _load_snapshot(signature)
+    if snapshot is not None:
+        df, search_index, id_index, ean_index, stats = snapshot
+        logger.info(f"Memory-mapped product snapshot from {SNAPSHOT_PATH}.")
+    else:
+        with _timed(phases, "read"):
+            df = polars.read_parquet(parquet_path)
+        raw_size = df.estimated_size("mb")
+        with _timed(phases, "prepare"):
+            df = optimize_schema(add_derived_columns(df))
+        logger.info(
+            f"Optimized product frame from {raw_size:.2f} MB "
+            f"to {df.estimated_size('mb'):.2f} MB."
+        )
+        with _timed(phases, "indexes"):
+            search_index = build_search_index(df)
+            search_index.fuzzy = build_text_index(df)
+            id_index = build_lookup_index(df, "Numero")
+            ean_index = build_lookup_index(df, "EAN")
+        with _timed(phases, "stats"):
+            stats = compute_stats(df, STATS_COUNT_FIELDS, RANGE_FILTERS)
+        with _timed(phases, "write_snapshot"):
+            try:
+                write_snapshot(
+                    SNAPSHOT_PATH,
+                    _snapshot_frames(df, search_index, id_index, ean_index),
+                    {
+                        "format": SNAPSHOT_FORMAT,
+                        "signature": list(signature),
+                        "stats": stats,
+                    },
+                )
+            except OSError as e:
+                logger.warning(f"Could not write product snapshot: {e}")
 
     if metadata_path.exists():
         metadata = json.loads(metadata_path.read_text())
@@ -34,96 +509,619 @@ def init_product_db() -> ProductDatabase:
     else:
         updated_at = datetime.fromtimestamp(parquet_path.stat().st_mtime)
 
-    logger.info(f"Loaded {len(df)} products (updated: {updated_at}).")
+    with _timed(phases, "changes"):
+        changes = polars.read_parquet(CHANGES_PATH) if CHANGES_PATH.exists() else None
+    load_seconds = time.perf_counter() - start
+
+    logger.info(
+        "Load phases: "
+        + ", ".join(
+            f"{name} {seconds * 1000:.0f}ms" for name, seconds in phases.items()
+        )
+    )
+    logger.info(
+        f"Loaded {len(df)} products (updated: {updated_at}) in {load_seconds:.2f}s."
+    )
 
     return ProductDatabase(
         df=df,
         updated_at=updated_at,
+        version=dataset_version(updated_at),
         product_count=len(df),
+        search_index=search_index,
+        id_index=id_index,
+        ean_index=ean_index,
+        stats=stats,
+        loaded_at=datetime.now(),
+        load_seconds=load_seconds,
+        changes=changes,
     )
 
 
-def search_products(
+def _range_selectivity(
+    sorted_values: polars.Series | None,
+    total_rows: int,
+    low: float | None,
+    high: float | None,
+) -> float:
+    """Fraction of all rows inside [low, high], from the presorted column values."""
+    if sorted_values is None or total_rows == 0:
+        return 0.5
+    start = 0 if low is None else sorted_values.search_sorted(low, side="left")
+    end = (
+        len(sorted_values)
+        if high is None
+        else sorted_values.search_sorted(high, side="right")
+    )
+    return max(end - start, 0) / total_rows
+
+
+def _membership_selectivity(
+    sorted_values: polars.Series | None, total_rows: int, values: Sequence[float]
+) -> float:
+    """Fraction of all rows equal to one of the values, from the presorted column."""
+    if sorted_values is None or total_rows == 0:
+        return 0.5
+    values = sorted(set(values))
+    starts = sorted_values.search_sorted(polars.Series(values), side="left")
+    ends = sorted_values.search_sorted(polars.Series(values), side="right")
+    return (ends - starts).sum() / total_rows
+
+
+def _string_predicate(
+    column: str, operator: str, terms: list[str]
+) -> tuple[polars.Expr, str]:
+    """Expression and label matching normalized terms in one string mode."""
+    values = ", ".join(json.dumps(term) for term in terms)
+    expr = polars.col(column)
+    if operator == "eq":
+        # A hash-set lookup against the precomputed normalized column.
+        return expr.is_in(terms), f"{column} in [{values}]"
+    if operator == "prefix":
+        matches = [expr.str.starts_with(term) for term in terms]
+        return reduce(lambda a, b: a | b, matches), f"{column} starts with {values}"
+    if len(terms) == 1:
+        expr = expr.str.contains(terms[0], literal=True)
+    else:
+        expr = expr.str.contains_any(terms)
+    if operator == "not":
+        return ~expr, f"{column} not contains {values}"
+    return expr, f"{column} contains {values}"
+
+
+def plan_search(
     df: polars.DataFrame,
-    name: str | None = None,
-    producer: str | None = None,
-    product_type: str | None = None,
-    subtype: str | None = None,
-    country: str | None = None,
-    area: str | None = None,
-    vintage: str | None = None,
-    grapes: str | None = None,
-    special_group: str | None = None,
-    beer_type: str | None = None,
-    package_type: str | None = None,
-    closure_type: str | None = None,
-    assortment: str | None = None,
-    min_price: float | None = None,
-    max_price: float | None = None,
-    min_alcohol: float | None = None,
-    max_alcohol: float | None = None,
-    min_sugar: float | None = None,
-    max_sugar: float | None = None,
-) -> polars.DataFrame:
-    """Find products with extended filtering options."""
-    string_column_mapping = {
-        "Nimi": name,
-        "Valmistaja": producer,
-        "Tyyppi": product_type,
-        "Alatyyppi": subtype,
-        "Valmistusmaa": country,
-        "Alue": area,
-        "Vuosikerta": vintage,
-        "Rypäleet": grapes,
-        "Erityisryhmä": special_group,
-        "Oluttyyppi": beer_type,
-        "Pakkaustyyppi": package_type,
-        "Suljentatyyppi": closure_type,
-        "Valikoima": assortment,
+    filters: ProductFilters,
+    index: SearchIndex | None = None,
+    limit: int | None = None,
+    sort: Sequence[tuple[str, bool]] = (),
+    after: list[int] | None = None,
+) -> SearchPlan:
+    """Plan a product search without touching the product frame.
+
+    Token postings narrow the candidate rows first. The remaining predicates are
+    ordered by estimated selectivity from precomputed column statistics and by
+    relative cost, so cheap and selective filters shrink the rows before the
+    substring matches run.
+    """
+    total_rows = df.height
+    query = filters.q or (
+        " ".join(filters.name) if filters.fuzzy and filters.name else None
+    )
+    terms = []
+    for field, column in STRING_FILTERS.items():
+        for operator in STRING_OPERATORS:
+            if field == "name" and not operator and filters.fuzzy:
+                continue
+            values = getattr(filters, filter_name(field, operator))
+            normalized = [
+                normalize_text(value) for value in values or () if value != "*"
+            ]
+            if normalized := [term for term in dict.fromkeys(normalized) if term]:
+                terms.append((column, operator, normalized))
+
+    candidates = None
+    index_columns = []
+    predicates = []
+    ranked = None
+    if query:
+        text_index = index.fuzzy if index and index.fuzzy else build_text_index(df)
+        words = re.findall(TOKEN_PATTERN, normalize_text(query))
+        ranked = fuzzy_search(text_index, words, FUZZY_CANDIDATES)
+        index_columns.append("fuzzy")
+
+    for column, operator, values in terms:
+        expr, label = _string_predicate(column, operator, values)
+        cost = STRING_COSTS[operator]
+        # Postings only tell which rows contain a term, which excludes nothing.
+        rows = (
+            _candidate_rows_any(index, column, values)
+            if index is not None and operator != "not"
+            else None
+        )
+        if rows is None:
+            selectivity = NEGATION_SELECTIVITY if operator == "not" else 0.5
+            predicates.append(SearchPredicate(column, label, expr, selectivity, cost))
+            continue
+
+        index_columns.append(column)
+        candidates = rows if candidates is None else candidates & rows
+        # Single whole-token substring terms are answered exactly by the postings.
+        if operator or any(
+            re.findall(TOKEN_PATTERN, term) != [term] for term in values
+        ):
+            selectivity = 0.5 if rows else 0.0
+            predicates.append(SearchPredicate(column, label, expr, selectivity, cost))
+
+    for field, column in RANGE_FILTERS.items():
+        low = getattr(filters, filter_name(field, "min"))
+        high = getattr(filters, filter_name(field, "max"))
+        members = getattr(filters, filter_name(field, "in"))
+        if low is None and high is None and not members:
+            continue
+
+        conditions, labels = [], []
+        if low is not None:
+            conditions.append(polars.col(column) >= low)
+            labels.append(f"{column} >= {low}")
+        if high is not None:
+            conditions.append(polars.col(column) <= high)
+            labels.append(f"{column} <= {high}")
+
+        sorted_values = index.sorted_values.get(column) if index else None
+        selectivity = _range_selectivity(sorted_values, total_rows, low, high)
+        if members:
+            # Compare as floats so integer columns like sugar match exactly.
+            conditions.append(polars.col(column).cast(polars.Float64).is_in(members))
+            labels.append(f"{column} in {sorted(set(members))}")
+            selectivity = min(
+                selectivity,
+                _membership_selectivity(sorted_values, total_rows, members),
+            )
+        predicates.append(
+            SearchPredicate(
+                column,
+                " and ".join(labels),
+                reduce(lambda a, b: a & b, conditions),
+                selectivity,
+                RANGE_COST,
+            )
+        )
+
+    predicates.sort(key=lambda predicate: predicate.rank)
+    if ranked is not None:
+        # Keep the similarity order; the filters below preserve row order.
+        if candidates is not None:
+            ranked = [row for row in ranked if row in candidates]
+        candidates = ranked
+    elif candidates is not None:
+        candidates = sorted(candidates)
+    return SearchPlan(
+        total_rows=total_rows,
+        candidates=candidates,
+        index_columns=index_columns,
+        predicates=predicates,
+        limit=limit,
+        sort=list(sort),
+        after=after,
+    )
+
+
+def parse_sort(sort: str | None) -> list[tuple[str, bool]]:
+    """Parse a `sort` parameter like `-price,name` into (field, descending) keys."""
+    keys = {}
+    for item in (sort or "").split(","):
+        item = item.strip()
+        name = item.removeprefix("-")
+        if not name:
+            continue
+        if name not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort field: {name}")
+        keys.setdefault(name, item.startswith("-"))
+    return list(keys.items())
+
+
+def _sort_label(sort: Sequence[tuple[str, bool]]) -> str:
+    return ",".join(f"-{name}" if descending else name for name, descending in sort)
+
+
+def _filters_digest(filters: ProductFilters) -> str:
+    """Short hash of the filter values; the order of alternatives does not matter."""
+    values = {
+        name: sorted(value) if isinstance(value, list) else value
+        for name, value in filters.model_dump(
+            include=set(ProductFilters.model_fields)
+        ).items()
+        if value is not None
     }
+    payload = json.dumps(values, sort_keys=True).encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
 
-    filters = [
-        polars.col(col).fill_null("").str.to_lowercase().str.contains(val.lower())
-        for col, val in string_column_mapping.items()
-        if val and val != "*"
-    ]
 
-    if min_price is not None:
-        filters.append(polars.col("Hinta") >= min_price)
-    if max_price is not None:
-        filters.append(polars.col("Hinta") <= max_price)
-    if min_alcohol is not None:
-        filters.append(polars.col("Alkoholi-%") >= min_alcohol)
-    if max_alcohol is not None:
-        filters.append(polars.col("Alkoholi-%") <= max_alcohol)
-    if min_sugar is not None:
-        filters.append(polars.col("Sokeri g/l") >= min_sugar)
-    if max_sugar is not None:
-        filters.append(polars.col("Sokeri g/l") <= max_sugar)
-
-    if filters:
-        df = df.filter(reduce(lambda a, b: a & b, filters))
+def encode_cursor(
+    version: str,
+    sort: Sequence[tuple[str, bool]],
+    filters: ProductFilters,
+    key: list[int],
+) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    payload = json.dumps(
+        {
+            "v": version,
+            "s": _sort_label(sort),
+            "f": _filters_digest(filters),
+            "k": key,
+        }
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str,
+    version: str,
+    sort: Sequence[tuple[str, bool]],
+    filters: ProductFilters,
+) -> list[int]:
+    """Decode a cursor, checking it belongs to this dataset version, sort and filters."""
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        key = [int(value) for value in payload["k"]]
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if payload.get("v") != version:
+        raise ValueError("Cursor is from an older dataset, start from the first page")
+    if payload.get("s") != _sort_label(sort) or len(key) != len(sort) + 1:
+        raise ValueError("Cursor does not match the requested sort")
+    if payload.get("f") != _filters_digest(filters):
+        raise ValueError("Cursor does not match the requested filters")
+    return key
+
+
+def _after_cursor(columns: list[str], key: list[int]) -> polars.Expr:
+    """Rows whose key columns sort strictly after `key`."""
+    conditions = []
+    for i, column in enumerate(columns):
+        condition = polars.col(column) > key[i]
+        for previous, value in zip(columns[:i], key[:i], strict=True):
+            condition &= polars.col(previous) == value
+        conditions.append(condition)
+    return reduce(lambda a, b: a | b, conditions)
+
+
+def search_rows(
+    df: polars.DataFrame, plan: SearchPlan, index: SearchIndex | None = None
+) -> polars.DataFrame:
+    """Run a search plan and return the matching row ids in result order.
+
+    Predicates run in plan order over a narrow frame holding only the filtered
+    columns, the sort ranks and row ids. Rows come in candidate order, which is
+    file order or fuzzy similarity, unless the plan sorts; sorting uses the
+    precomputed ranks and a partial top-k instead of a full sort. The
+    candidate `position` breaks ties, so the returned sort keys order every row
+    uniquely and can resume a page from a cursor.
+    """
+    columns = []
+    for column in dict.fromkeys(predicate.column for predicate in plan.predicates):
+        if column not in SEARCH_COLUMNS:
+            columns.append(df[column])
+        elif index is not None:
+            columns.append(index.normalized[column])
+        else:
+            columns.append(df.select(normalize_expr(column)).to_series())
+    if plan.sort:
+        ranks = index.ranks if index is not None else build_sort_ranks(df)
+        columns.extend(ranks[name] for name, _ in plan.sort)
+
+    if columns:
+        narrow = polars.DataFrame(columns).with_row_index("row")
+    else:
+        narrow = polars.select(
+            polars.int_range(df.height, dtype=polars.UInt32).alias("row")
+        )
+    if plan.candidates is not None:
+        narrow = narrow[plan.candidates]
+    narrow = narrow.with_row_index("position")
+
+    lazy = narrow.lazy()
+    for predicate in plan.predicates:
+        # Collect between steps so the planned order is kept instead of the
+        # optimizer fusing every predicate into a single pass.
+        lazy = lazy.filter(predicate.expr).collect().lazy()
+
+    keys = []
+    for name, descending in plan.sort:
+        key = polars.col(name)
+        if descending:
+            # Reverse the ranks but keep nulls, ranked as the row count, last.
+            key = (
+                polars.when(key == plan.total_rows)
+                .then(key)
+                .otherwise(plan.total_rows - 1 - key)
+            )
+        keys.append(key.alias(f"sort_{name}"))
+    key_columns = [f"sort_{name}" for name, _ in plan.sort] + ["position"]
+    lazy = lazy.select("row", *keys, "position")
+
+    if plan.after is not None:
+        lazy = lazy.filter(_after_cursor(key_columns, plan.after))
+    if plan.sort and plan.limit is not None:
+        lazy = lazy.bottom_k(plan.limit, by=key_columns).sort(key_columns)
+    elif plan.sort:
+        lazy = lazy.sort(key_columns)
+    elif plan.limit is not None:
+        lazy = lazy.head(plan.limit)
+    return lazy.collect()
+
+
+def execute_search(
+    df: polars.DataFrame, plan: SearchPlan, index: SearchIndex | None = None
+) -> polars.DataFrame:
+    """Run a search plan and return the matching product rows.
+
+    Only the rows that survive the limit are gathered from the full product
+    frame.
+    """
+    if (
+        plan.candidates is None
+        and not plan.predicates
+        and not plan.sort
+        and plan.after is None
+    ):
+        return df if plan.limit is None else df.head(plan.limit)
+    with stage("filter"):
+        rows = search_rows(df, plan, index)
+    with stage("materialize"):
+        return df[rows["row"]]
+
+
+def search_page(
+    df: polars.DataFrame,
+    filters: ProductFilters,
+    index: SearchIndex | None = None,
+    limit: int = 100,
+    sort: str | None = None,
+    cursor: str | None = None,
+    version: str = "",
+) -> tuple[polars.DataFrame, str | None, SearchPlan]:
+    """Find one page of products, the cursor of the next page, if any, and the plan run.
+
+    Raises ValueError for unknown sort fields and invalid or stale cursors.
+    """
+    keys = parse_sort(sort)
+    after = decode_cursor(cursor, version, keys, filters) if cursor else None
+    with stage("filter"):
+        plan = plan_search(
+            df, filters, index=index, limit=limit + 1, sort=keys, after=after
+        )
+        rows = search_rows(df, plan, index)
+    return (*_page(df, rows, limit, keys, filters, version), plan)
+
+
+def search_page_with_facets(
+    df: polars.DataFrame,
+    filters: ProductFilters,
+    fields: Sequence[str],
+    index: SearchIndex | None = None,
+    limit: int = 100,
+    sort: str | None = None,
+    cursor: str | None = None,
+    version: str = "",
+) -> tuple[polars.DataFrame, str | None, dict, SearchPlan]:
+    """Find one page of products, its next cursor and facets over every match.
+
+    The filters run once: facets are counted over all matching rows, and the
+    page is cut from the same rows after the cursor. The plan run is returned
+    last.
+    """
+    keys = parse_sort(sort)
+    after = decode_cursor(cursor, version, keys, filters) if cursor else None
+    with stage("filter"):
+        plan = plan_search(df, filters, index=index, sort=keys)
+        rows = search_rows(df, plan, index)
+    columns = [STRING_FILTERS[field] for field in fields if field in STRING_FILTERS]
+    facets = get_facets(df.select(columns)[rows["row"]], fields)
+    if after is not None:
+        key_columns = [f"sort_{name}" for name, _ in keys] + ["position"]
+        rows = rows.filter(_after_cursor(key_columns, after))
+    return (*_page(df, rows, limit, keys, filters, version), facets, plan)
+
+
+def _page(
+    df: polars.DataFrame,
+    rows: polars.DataFrame,
+    limit: int,
+    keys: Sequence[tuple[str, bool]],
+    filters: ProductFilters,
+    version: str,
+) -> tuple[polars.DataFrame, str | None]:
+    """Gather the first `limit` matched rows and the cursor after them, if more remain."""
+    next_cursor = None
+    if rows.height > limit:
+        rows = rows.head(limit)
+        key = list(rows.drop("row").row(-1))
+        next_cursor = encode_cursor(version, keys, filters, key)
+    with stage("materialize"):
+        return df[rows["row"]], next_cursor
+
+
+def search_products(
+    df: polars.DataFrame,
+    index: SearchIndex | None = None,
+    limit: int | None = None,
+    sort: str | None = None,
+    **filters,
+) -> polars.DataFrame:
+    """Find products with extended filtering options.
+
+    `filters` are `ProductFilters` fields. String filters are case- and
+    accent-insensitive substring matches, or exact, prefix or negated matches
+    through the `__eq`, `__prefix` and `__not` suffixes, and take a single
+    value or a list of alternatives. When a search index is given, candidate
+    rows are narrowed through its token postings before the frame is filtered.
+    With `q`, or `name` and `fuzzy`, results are ranked by trigram similarity
+    to the free text instead. `sort` takes comma-separated `SORT_COLUMNS`
+    fields, `-` prefixed for descending.
+    """
+    unknown = sorted(set(filters) - set(ProductFilters.model_fields))
+    if unknown:
+        raise TypeError(f"Unknown filters: {', '.join(unknown)}")
+    filters = ProductFilters(**filters)
+    with stage("filter"):
+        plan = plan_search(df, filters, index=index, limit=limit, sort=parse_sort(sort))
+    df = execute_search(df, plan, index=index)
 
     logger.info(f"Found {len(df)} results after filtering.")
 
     return df
 
 
+def get_facets(df: polars.DataFrame, fields: Sequence[str]) -> dict:
+    """Count values of the given filter fields over matching products."""
+    unknown = [field for field in fields if field not in STRING_FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown facet: {', '.join(unknown)}")
+    with stage("facets"):
+        return facet_counts(df, {field: STRING_FILTERS[field] for field in fields})
+
+
+def get_products_by_ids(
+    db: ProductDatabase, product_ids: Sequence[str] = (), eans: Sequence[str] = ()
+) -> polars.DataFrame:
+    """Look up products by ID and EAN, in request order and without duplicates."""
+    rows = lookup_rows(db.id_index, product_ids) + lookup_rows(db.ean_index, eans)
+    return db.df[list(dict.fromkeys(rows))]
+
+
+def get_changes(
+    changes: polars.DataFrame | None, since: datetime | None = None
+) -> polars.DataFrame:
+    """Catalog changes recorded by the scraper after `since`, oldest first."""
+    if changes is None:
+        return polars.DataFrame()
+    if since is not None and since.tzinfo is not None:
+        # `changed_at` is the scraper's naive local time.
+        since = since.astimezone().replace(tzinfo=None)
+    if since is not None:
+        changes = changes.filter(polars.col("changed_at") > since)
+    return changes
+
+
+def serialize_changes(changes: polars.DataFrame) -> bytes:
+    """Serialize catalog changes to JSON with ISO 8601 timestamps."""
+    if "changed_at" in changes.columns:
+        changes = changes.with_columns(
+            polars.col("changed_at").dt.strftime("%Y-%m-%dT%H:%M:%S%.6f")
+        )
+    buffer = io.BytesIO()
+    changes.write_json(buffer)
+    return buffer.getvalue()
+
+
+def _link_expr(template: str) -> polars.Expr:
+    prefix, suffix = template.split("{product_id}")
+    return polars.concat_str(
+        [polars.lit(prefix), polars.col("Numero").cast(polars.Utf8), polars.lit(suffix)]
+    )
+
+
+def product_frame(df: polars.DataFrame) -> polars.DataFrame:
+    """Shape products like the serialized `Product` schema without validating rows.
+
+    Columns keep their aliases, are cast to the field types and the computed
+    link fields are built as vectorized string expressions.
+    """
+    columns = []
+    for field in Product.model_fields.values():
+        expr = polars.col(field.alias).cast(FIELD_DTYPES[field.annotation])
+        if field.annotation in (str, bool) and not field.is_required():
+            expr = expr.fill_null(field.default)
+        columns.append(expr)
+    columns.extend(
+        _link_expr(template).alias(name)
+        for name, template in COMPUTED_LINK_TEMPLATES.items()
+    )
+    return df.select(columns)
+
+
+def serialize_products(df: polars.DataFrame) -> bytes:
+    """Serialize products to JSON bytes matching the `Product` response schema."""
+    buffer = io.BytesIO()
+    with stage("serialize"):
+        product_frame(df).write_json(buffer)
+    return buffer.getvalue()
+
+
+def serialize_products_arrow(df: polars.DataFrame) -> bytes:
+    """Serialize products as an uncompressed Arrow IPC stream."""
+    buffer = io.BytesIO()
+    with stage("serialize"):
+        product_frame(df).write_ipc_stream(buffer)
+    return buffer.getvalue()
+
+
+def serialize_products_parquet(df: polars.DataFrame) -> bytes:
+    """Serialize products as a Parquet file."""
+    buffer = io.BytesIO()
+    with stage("serialize"):
+        product_frame(df).write_parquet(buffer)
+    return buffer.getvalue()
+
+
+def resolve_fields(fields: Sequence[str]) -> list[str]:
+    """Map requested `Product` field names or aliases to serialized column names."""
+    aliases = {name: field.alias for name, field in Product.model_fields.items()}
+    aliases.update({name: name for name in Product.model_computed_fields})
+    columns = {*aliases.values()}
+
+    resolved = []
+    for field in fields:
+        column = aliases.get(field, field)
+        if column not in columns:
+            raise ValueError(f"Unknown field: {field}")
+        resolved.append(column)
+    return resolved
+
+
+def iter_ndjson(
+    df: polars.DataFrame,
+    fields: Sequence[str] | None = None,
+    batch_size: int = 1000,
+) -> Iterator[bytes]:
+    """Yield products as newline-delimited JSON, one batch of rows at a time."""
+    for batch in df.iter_slices(n_rows=batch_size):
+        frame = product_frame(batch)
+        if fields:
+            frame = frame.select(fields)
+        buffer = io.BytesIO()
+        frame.write_ndjson(buffer)
+        yield buffer.getvalue()
+
+
+def _categories(df: polars.DataFrame, column: str) -> list[str]:
+    """Distinct non-null values, read from the enum dictionary when available."""
+    series = df[column]
+    if isinstance(series.dtype, polars.Enum | polars.Categorical):
+        return series.cat.get_categories().to_list()
+    return series.drop_nulls().unique().sort().to_list()
+
+
 def get_product_types(df: polars.DataFrame) -> list[str]:
     """Get all unique product types."""
-    return df["Tyyppi"].drop_nulls().unique().to_list()
+    return _categories(df, "Tyyppi")
 
 
 def get_producers(df: polars.DataFrame) -> list[str]:
     """Get all unique producers."""
-    return df["Valmistaja"].drop_nulls().unique().to_list()
+    return _categories(df, "Valmistaja")
 
 
 def get_countries(df: polars.DataFrame) -> list[str]:
     """Get all unique countries."""
-    return df["Valmistusmaa"].drop_nulls().unique().to_list()
+    return _categories(df, "Valmistusmaa")
 
 
 def get_areas(df: polars.DataFrame) -> list[str]:
     """Get all unique areas."""
-    return df["Alue"].drop_nulls().unique().to_list()
+    return _categories(df, "Alue")
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from fastapi import FastAPI
+
+from app.schemas.products import ProductDatabase
+from app.services.metrics import DATASET_LOAD_SECONDS
+from app.services.products import dataset_signature, init_product_db
+
+logger = logging.getLogger(__name__)
+
+_reload_lock = asyncio.Lock()
+
+
+async def reload_product_db(app: FastAPI) -> ProductDatabase:
+    """Load the dataset off the event loop and swap it into the app state.
+
+    Requests that already hold the previous snapshot finish on it; new requests
+    see the new one. Concurrent reloads are serialized.
+    """
+    async with _reload_lock:
+        logger.info("Reloading product database...")
+        db = await asyncio.to_thread(init_product_db)
+        app.state.products = db
+        app.state.response_cache.clear(db.version)
+        DATASET_LOAD_SECONDS.observe(db.load_seconds, "reload")
+        logger.info(f"Reloaded dataset version {db.version} in {db.load_seconds:.2f}s.")
+        return db
+
+
+async def watch_product_db(app: FastAPI, interval: float):
+    """Reload the dataset whenever the data files change on disk."""
+    signature = await asyncio.to_thread(dataset_signature)
+    while True:
+        await asyncio.sleep(interval)
+        current = await asyncio.to_thread(dataset_signature)
+        if current == signature:
+            continue
+        try:
+            await reload_product_db(app)
+            signature = current
+        except Exception:
+            logger.exception("Failed to reload product database.")
@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import polars
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def write_snapshot(
+    path: Path, frames: dict[str, polars.DataFrame], manifest: dict
+) -> None:
+    """Write frames as uncompressed Arrow IPC files that workers can memory-map.
+
+    Each file is written to a temporary name and moved into place, so workers
+    that already mapped the previous files keep reading them undisturbed. The
+    manifest goes last and marks the snapshot complete.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    for name, frame in frames.items():
+        target = path / f"{name}.arrow"
+        temporary = target.with_suffix(f".arrow.{os.getpid()}.tmp")
+        frame.rechunk().write_ipc(temporary, compression="uncompressed")
+        os.replace(temporary, target)
+
+    target = path / MANIFEST_NAME
+    temporary = target.with_suffix(f".json.{os.getpid()}.tmp")
+    temporary.write_text(json.dumps({**manifest, "frames": sorted(frames)}))
+    os.replace(temporary, target)
+
+
+def read_manifest(path: Path) -> dict | None:
+    """Read the snapshot manifest, or None when there is no complete snapshot."""
+    try:
+        return json.loads((path / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def read_snapshot(path: Path, manifest: dict) -> dict[str, polars.DataFrame]:
+    """Memory-map every frame listed in the manifest."""
+    return {
+        name: polars.read_ipc(path / f"{name}.arrow", memory_map=True, rechunk=False)
+        for name in manifest["frames"]
+    }
+
+
+def main():
+    """Build the snapshot ahead of time, e.g. during a container build."""
+    from app.services.products import init_product_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_product_db()
+
+
+if __name__ == "__main__":
+    main()
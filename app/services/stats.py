@@ -0,0 +1,83 @@
+import polars
+
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+# Lower bin edges; the last bin is open-ended.
+HISTOGRAM_EDGES = {
+    "Hinta": (0, 10, 15, 20, 30, 50, 100, 250, 500, 1000),
+    "Alkoholi-%": (0, 0.5, 5, 10, 15, 20, 30, 40, 50),
+    "Sokeri g/l": (0, 1, 5, 10, 20, 50, 100),
+}
+
+
+def value_counts(df: polars.DataFrame, column: str) -> list[dict]:
+    """Count non-null values of a column, most common first."""
+    counts = (
+        df.group_by(column)
+        .len()
+        .drop_nulls(column)
+        .with_columns(polars.col(column).cast(polars.Utf8))
+        .sort(["len", column], descending=[True, False])
+    )
+    return [{"value": value, "count": count} for value, count in counts.rows()]
+
+
+def histogram(sorted_values: polars.Series, edges: tuple[float, ...]) -> list[dict]:
+    """Bin counts of presorted values, using binary search for each edge."""
+    positions = [sorted_values.search_sorted(edge, side="left") for edge in edges]
+    positions.append(len(sorted_values))
+    return [
+        {
+            "min": edges[i],
+            "max": edges[i + 1] if i + 1 < len(edges) else None,
+            "count": positions[i + 1] - positions[i],
+        }
+        for i in range(len(edges))
+    ]
+
+
+def numeric_summary(series: polars.Series) -> dict:
+    """Min, max, mean, percentiles and a histogram of a numeric column."""
+    values = series.drop_nulls().sort()
+    if values.is_empty():
+        return {"count": 0}
+
+    summary = {
+        "count": len(values),
+        "min": values[0],
+        "max": values[-1],
+        "mean": round(values.mean(), 2),
+        "percentiles": {
+            f"p{round(q * 100)}": round(values.quantile(q, "linear"), 2)
+            for q in PERCENTILES
+        },
+    }
+    if series.name in HISTOGRAM_EDGES:
+        summary["histogram"] = histogram(values, HISTOGRAM_EDGES[series.name])
+    return summary
+
+
+def compute_stats(
+    df: polars.DataFrame,
+    count_columns: dict[str, str],
+    numeric_columns: dict[str, str],
+) -> dict:
+    """Compute the statistics snapshot served by `/stats` and `/products/stats`.
+
+    Both mappings go from the public field name to the frame column.
+    """
+    return {
+        "product_count": df.height,
+        "counts": {
+            field: value_counts(df, column) for field, column in count_columns.items()
+        },
+        "numeric": {
+            field: numeric_summary(df[column])
+            for field, column in numeric_columns.items()
+        },
+    }
+
+
+def facet_counts(df: polars.DataFrame, columns: dict[str, str]) -> dict:
+    """Value counts over an already filtered frame, keyed by field name."""
+    return {field: value_counts(df, column) for field, column in columns.items()}
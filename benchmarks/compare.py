@@ -0,0 +1,66 @@
+"""Compare two benchmark result files and flag regressions.
+
+Latencies (p50, p95) regress when they grow, throughput when it drops, by
+more than the threshold. Exits with status 1 if anything regressed.
+
+>>> uv run python -m benchmarks.compare benchmarks/results/micro-abc1234.json \
+        benchmarks/results/micro-def5678.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# metric -> whether a higher value is better
+METRICS = {"p50_ms": False, "p95_ms": False, "rps": True}
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Print the change of every shared case and metric; return the regressions."""
+    regressions = []
+    print(
+        f"{'case':>28} {'metric':>7} {'baseline':>10} {'candidate':>10} {'change':>8}"
+    )
+    for case, before in baseline["results"].items():
+        after = candidate["results"].get(case)
+        if after is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in before or metric not in after or not before[metric]:
+                continue
+            change = (after[metric] - before[metric]) / before[metric] * 100
+            regressed = -change > threshold if higher_is_better else change > threshold
+            flag = "  REGRESSION" if regressed else ""
+            print(
+                f"{case:>28} {metric:>7} {before[metric]:10.3f} "
+                f"{after[metric]:10.3f} {change:+7.1f}%{flag}"
+            )
+            if regressed:
+                regressions.append(f"{case} {metric} {change:+.1f}%")
+    return regressions
+
+
+def main(baseline: Path, candidate: Path, threshold: float = 10) -> int:
+    before = json.loads(baseline.read_text())
+    after = json.loads(candidate.read_text())
+    if before["benchmark"] != after["benchmark"]:
+        print(f"Comparing {before['benchmark']} with {after['benchmark']} results.")
+    print(
+        f"baseline {before['environment']['commit']}, "
+        f"candidate {after['environment']['commit']}"
+    )
+    regressions = compare(before, after, threshold)
+    if regressions:
+        print(f"{len(regressions)} regressions over {threshold:g}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=10)
+    args = parser.parse_args()
+    sys.exit(main(args.baseline, args.candidate, args.threshold))
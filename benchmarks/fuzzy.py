@@ -0,0 +1,98 @@
+"""Compare the trigram-indexed fuzzy search with a naive scan over every row.
+
+>>> uv run python -m benchmarks.fuzzy
+"""
+
+import re
+import time
+
+import app.services.products as product_service
+from app.services.fuzzy import MIN_SIMILARITY, trigrams
+
+QUERIES = (
+    "koskenkorva",
+    "koskenkorav",
+    "chateau margoux",
+    "pinot noir bourgogne",
+    "lonkero greippi",
+    "jaloviina",
+)
+
+
+def naive_search(texts: list[list[tuple[list[str], float]]], query: str, limit: int):
+    """Score every row by comparing each query word with each of its words."""
+    words = [
+        trigrams(word)
+        for word in re.findall(
+            product_service.TOKEN_PATTERN, product_service.normalize_text(query)
+        )
+    ]
+    scores = []
+    for row, columns in enumerate(texts):
+        score = 0.0
+        for query_grams in words:
+            best = 0.0
+            for row_words, weight in columns:
+                for row_grams in row_words:
+                    shared = len(query_grams & row_grams)
+                    similarity = shared / (len(query_grams) + len(row_grams) - shared)
+                    if similarity >= MIN_SIMILARITY:
+                        best = max(best, similarity * weight)
+            score += best
+        if score:
+            scores.append((score, -row))
+    scores.sort(reverse=True)
+    return [-row for _, row in scores[:limit]]
+
+
+def measure(func, rounds: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(rounds: int = 5, limit: int = 10):
+    db = product_service.init_product_db()
+
+    start = time.perf_counter()
+    index = product_service.build_text_index(db.df)
+    print(
+        f"index: {len(index.words)} words, "
+        f"built in {(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+
+    words = db.df.select(
+        product_service.normalize_expr(column).str.extract_all(
+            product_service.TOKEN_PATTERN
+        )
+        for column in product_service.FUZZY_WEIGHTS
+    )
+    texts = [
+        [
+            ([trigrams(word) for word in row_words], weight)
+            for row_words, weight in zip(
+                row, product_service.FUZZY_WEIGHTS.values(), strict=True
+            )
+        ]
+        for row in words.rows()
+    ]
+
+    print(f"{'query':>22} {'naive':>10} {'indexed':>10}  top match")
+    for query in QUERIES:
+        naive = measure(lambda q=query: naive_search(texts, q, limit), rounds)
+        indexed = measure(
+            lambda q=query: product_service.search_products(
+                db.df, q=q, index=db.search_index, limit=limit
+            ),
+            rounds,
+        )
+        top = product_service.search_products(
+            db.df, q=query, index=db.search_index, limit=1
+        )["Nimi"].to_list()
+        print(f"{query:>22} {naive:8.2f}ms {indexed:8.2f}ms  {top}")
+
+
+if __name__ == "__main__":
+    main()
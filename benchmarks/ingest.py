@@ -0,0 +1,95 @@
+"""Measure ingest time and peak memory of the product sheet parsers.
+
+Runs offline against a stored workbook. Without a path, a sample workbook in
+the Alko layout is generated from `data/products.parquet`.
+
+>>> uv run python -m benchmarks.ingest [path/to/alkon-hinnasto.xlsx]
+"""
+
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import polars
+
+from scraper.fetch_products import HEADER_ROW, SHEET_NAME, read_sheet
+from tests.workbook import write_sample_workbook
+
+SAMPLE_SOURCE = Path(__file__).parent.parent / "data" / "products.parquet"
+
+
+def xlsx2csv_sheet(path: Path) -> polars.DataFrame:
+    """The previous parser: convert the sheet to CSV with xlsx2csv, then read it."""
+    df = polars.read_excel(
+        source=str(path),
+        sheet_name=SHEET_NAME,
+        engine="xlsx2csv",
+        read_options={
+            "skip_rows": HEADER_ROW,
+            "schema_overrides": dict.fromkeys(
+                (
+                    "Nimi",
+                    "Valmistaja",
+                    "Hinnastojärjestyskoodi",
+                    "Numero",
+                    "EAN",
+                    "Luonnehdinta",
+                    "Rypäleet",
+                ),
+                polars.Utf8,
+            ),
+        },
+    )
+    df = df.with_columns(polars.col("Uutuus").is_not_null())
+    return df.with_columns(
+        polars.col(polars.Utf8).str.replace_all("\xa0", " ").str.strip_chars()
+    )
+
+
+PARSERS = {"calamine": read_sheet, "xlsx2csv": xlsx2csv_sheet}
+
+
+def _run(name: str, path: Path, queue: multiprocessing.Queue):
+    start = time.perf_counter()
+    try:
+        rows = PARSERS[name](path).height
+    except Exception as e:
+        queue.put((name, None, None, f"{type(e).__name__}: {e}"))
+        return
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((name, seconds, peak_mb, rows))
+
+
+def measure(name: str, path: Path) -> tuple:
+    """Parse in a fresh process, so the peak RSS belongs to that parser alone."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run, args=(name, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(path: Path | None = None):
+    with tempfile.TemporaryDirectory() as directory:
+        if path is None:
+            path = Path(directory) / "sample.xlsx"
+            write_sample_workbook(polars.read_parquet(SAMPLE_SOURCE), path)
+        print(f"workbook: {path} ({path.stat().st_size / 1024 / 1024:.1f} MB)")
+
+        print(f"{'parser':>10} {'time':>10} {'peak rss':>10}  rows")
+        for name in PARSERS:
+            name, seconds, peak_mb, rows = measure(name, path)
+            if seconds is None:
+                print(f"{name:>10} skipped: {rows}")
+            else:
+                print(f"{name:>10} {seconds:9.2f}s {peak_mb:8.0f}MB  {rows}")
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else None)
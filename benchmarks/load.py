@@ -0,0 +1,119 @@
+"""Load-test the API in-process through the ASGI transport, without a server.
+
+Each endpoint is hit by concurrent clients on the same event loop as the app,
+so the figures include routing, the executor, caching and serialization but
+no network. Throughput and p50/p95/p99 latencies are saved as JSON under
+`benchmarks/results`. Pass `--no-cache` to measure every request as a miss.
+
+>>> uv run python -m benchmarks.load [--requests 500] [--concurrency 16] [--no-cache]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+from app.main import app
+from benchmarks.report import summarize, write_results
+from benchmarks.search import QUERY_MIX
+
+ENDPOINTS = {
+    "readyz": ["/readyz"],
+    "product": ["/products/906458", "/products/447237", "/products/ean/7350084980013"],
+    "productTypes": ["/products/productTypes"],
+    "stats": ["/products/stats"],
+    "queryProducts": [
+        f"/products/queryProducts?{urlencode(filters)}"
+        for filters in QUERY_MIX.values()
+    ],
+    "queryProducts+sort": [
+        "/products/queryProducts?product_type=punaviinit&sort=-price,name&limit=20",
+        "/products/queryProducts?country=Italia&sort=price_per_alcohol_liter&limit=20",
+    ],
+    "queryProducts+facets": [
+        "/products/queryProducts?product_type=punaviinit&facets=country,grapes",
+        "/products/queryProducts?min_price=10&max_price=15&facets=product_type",
+    ],
+    "queryProducts+fuzzy": [
+        "/products/queryProducts?q=koskenkorav",
+        "/products/queryProducts?q=chateau%20margoux",
+    ],
+}
+
+
+async def load_endpoint(
+    client: httpx.AsyncClient, urls: list[str], requests: int, concurrency: int
+) -> dict:
+    """Send `requests` GETs cycling through `urls` from `concurrency` clients."""
+    latencies: list[float] = []
+    errors = 0
+    sent = 0
+
+    async def worker():
+        nonlocal errors, sent
+        while sent < requests:
+            url = urls[sent % len(urls)]
+            sent += 1
+            start = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            if response.is_error:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        **summarize(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+    }
+
+
+async def main(requests: int = 500, concurrency: int = 16, cache: bool = True):
+    logging.disable(logging.INFO)
+    async with app.router.lifespan_context(app):
+        if not cache:
+            # Bodies larger than the cache are never stored.
+            app.state.response_cache.max_bytes = 0
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for urls in ENDPOINTS.values():
+                for url in urls:
+                    (await client.get(url)).raise_for_status()
+
+            results = {}
+            print(
+                f"{'endpoint':>22} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} errors"
+            )
+            for name, urls in ENDPOINTS.items():
+                result = results[name] = await load_endpoint(
+                    client, urls, requests, concurrency
+                )
+                print(
+                    f"{name:>22} {result['rps']:8.1f} {result['p50_ms']:7.2f}ms "
+                    f"{result['p95_ms']:7.2f}ms {result['p99_ms']:7.2f}ms "
+                    f"{result['errors']:>6}"
+                )
+
+    path = write_results(
+        "load" if cache else "load-nocache",
+        results,
+        {"requests": requests, "concurrency": concurrency, "cache": cache},
+    )
+    print(f"results: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-cache", dest="cache", action="store_false")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.cache))
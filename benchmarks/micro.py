@@ -0,0 +1,93 @@
+"""Micro-benchmarks of the service layer, saved as JSON under `benchmarks/results`.
+
+Covers `search_products` over a realistic filter mix, the distinct-value
+helpers and `init_product_db`, both from the snapshot and rebuilt from
+`data/products.parquet`.
+
+>>> uv run python -m benchmarks.micro [--rounds 50]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import app.services.products as product_service
+from benchmarks.report import summarize, write_results
+from benchmarks.search import QUERY_MIX
+
+SEARCHES = {
+    **QUERY_MIX,
+    "sorted": {"product_type": "punaviinit", "sort": "-price,name"},
+    "value-sort": {"max_price_per_drink": 2, "sort": "price_per_alcohol_liter"},
+    "fuzzy": {"q": "koskenkorav"},
+    "fuzzy+filter": {"q": "pinot noir", "country": "Ranska"},
+}
+DISTINCT_HELPERS = ("product_types", "producers", "countries", "areas")
+
+
+def measure(func: Callable[[], object], rounds: int) -> list[float]:
+    func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def rebuild_product_db():
+    """Load without a snapshot, as on the first start after a new fetch."""
+    snapshot_path = product_service.SNAPSHOT_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        product_service.SNAPSHOT_PATH = Path(directory) / "snapshot"
+        try:
+            return product_service.init_product_db()
+        finally:
+            product_service.SNAPSHOT_PATH = snapshot_path
+
+
+def main(rounds: int = 50, limit: int = 100, load_rounds: int = 3):
+    logging.disable(logging.INFO)
+    db = product_service.init_product_db()
+
+    cases: dict[str, list[float]] = {}
+    for label, filters in SEARCHES.items():
+        cases[f"search/{label}"] = measure(
+            lambda f=filters: product_service.search_products(
+                db.df, **f, index=db.search_index, limit=limit
+            ),
+            rounds,
+        )
+    for name in DISTINCT_HELPERS:
+        helper = getattr(product_service, f"get_{name}")
+        cases[f"distinct/{name}"] = measure(lambda h=helper: h(db.df), rounds)
+    cases["load/snapshot"] = measure(product_service.init_product_db, load_rounds)
+    cases["load/rebuild"] = measure(rebuild_product_db, load_rounds)
+
+    results = {}
+    print(f"{'case':>28} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for case, timings in cases.items():
+        results[case] = summarize(timings)
+        print(
+            f"{case:>28} {results[case]['p50_ms']:8.3f}ms "
+            f"{results[case]['p95_ms']:8.3f}ms {results[case]['p99_ms']:8.3f}ms"
+        )
+
+    path = write_results(
+        "micro",
+        results,
+        {"rounds": rounds, "limit": limit, "load_rounds": load_rounds},
+    )
+    print(f"results: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--load-rounds", type=int, default=3)
+    args = parser.parse_args()
+    main(args.rounds, args.limit, args.load_rounds)
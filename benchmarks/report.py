@@ -0,0 +1,83 @@
+"""Store benchmark results as JSON, so runs can be compared between commits.
+
+Each run is written to `benchmarks/results/<benchmark>-<commit>.json`; see
+`benchmarks.compare` to diff two of them.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import polars
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+
+def summarize(seconds: list[float]) -> dict:
+    """Latency statistics in milliseconds for a list of timings in seconds."""
+    ms = sorted(value * 1000 for value in seconds)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "min_ms": round(ms[0], 4),
+        "p50_ms": round(p50, 4),
+        "p95_ms": round(p95, 4),
+        "p99_ms": round(p99, 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> dict:
+    """The commit and machine a run was measured on."""
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    if _git("status", "--porcelain", "--untracked-files=no"):
+        commit += "-dirty"
+    return {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": polars.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(benchmark: str, results: dict, settings: dict | None = None) -> Path:
+    """Write one run's results with its environment, and return the file path."""
+    env = environment()
+    RESULTS_PATH.mkdir(exist_ok=True)
+    path = RESULTS_PATH / f"{benchmark}-{env['commit']}.json"
+    path.write_text(
+        json.dumps(
+            {
+                "benchmark": benchmark,
+                "environment": env,
+                "settings": settings or {},
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    return path
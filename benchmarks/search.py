@@ -0,0 +1,84 @@
+"""Compare the original eager search with the planned, index-backed search.
+
+>>> uv run python -m benchmarks.search
+"""
+
+import time
+from functools import reduce
+
+import polars
+
+import app.services.products as product_service
+
+QUERY_MIX = {
+    "country": {"country": "Ranska"},
+    "name": {"name": "cabernet sauvignon"},
+    "name+price": {"name": "pinot noir", "max_price": 25},
+    "type+country+alcohol": {
+        "product_type": "punaviinit",
+        "country": "Italia",
+        "min_alcohol": 14,
+    },
+    "grapes+area": {"grapes": "riesling", "area": "mosel"},
+    "price-range": {"min_price": 10, "max_price": 15},
+    "expensive+name": {"name": "whisky", "min_price": 500},
+    "wide": {"product_type": "viini"},
+}
+
+
+def baseline_search(df: polars.DataFrame, limit: int | None = None, **filters):
+    """The original implementation: one eager AND over every row."""
+    # Categorical columns are stored as Enum now; the original read strings.
+    expressions = [
+        polars.col(column)
+        .cast(polars.Utf8)
+        .fill_null("")
+        .str.to_lowercase()
+        .str.contains(value.lower())
+        for field, column in product_service.STRING_FILTERS.items()
+        if (value := filters.get(field))
+    ]
+    for field, column in product_service.RANGE_FILTERS.items():
+        if (low := filters.get(f"min_{field}")) is not None:
+            expressions.append(polars.col(column) >= low)
+        if (high := filters.get(f"max_{field}")) is not None:
+            expressions.append(polars.col(column) <= high)
+    if expressions:
+        df = df.filter(reduce(lambda a, b: a & b, expressions))
+    return df if limit is None else df.head(limit)
+
+
+def measure(func, rounds: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(rounds: int = 20, limit: int = 100):
+    db = product_service.init_product_db()
+
+    print(f"{'query':>22} {'baseline':>10} {'planned':>10} {'rows':>6}  plan")
+    for label, filters in QUERY_MIX.items():
+        baseline = measure(lambda f=filters: baseline_search(db.df, limit, **f), rounds)
+        planned = measure(
+            lambda f=filters: product_service.search_products(
+                db.df, **f, index=db.search_index, limit=limit
+            ),
+            rounds,
+        )
+        plan = product_service.plan_search(
+            db.df,
+            product_service.ProductFilters(**filters),
+            index=db.search_index,
+            limit=limit,
+        )
+        rows = product_service.execute_search(db.df, plan, db.search_index).height
+        print(
+            f"{label:>22} {baseline:8.2f}ms {planned:8.2f}ms {rows:>6}  {plan.describe()}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Profile cold start: module import time and the time to a loaded dataset.
+
+Every round runs in a fresh interpreter. The import profile comes from
+`python -X importtime` and lists the direct imports of `app.main`; startup
+splits a process's time into importing the app and running its lifespan.
+Results are saved as JSON under `benchmarks/results`.
+
+>>> uv run python -m benchmarks.startup [--rounds 5]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.report import summarize, write_results
+
+ROOT = Path(__file__).parent.parent
+# Heavy dependencies reported wherever they are first imported.
+DEPENDENCIES = ("fastapi", "pydantic", "polars", "jinja2", "orjson", "httpx")
+
+STARTUP_SCRIPT = """
+import asyncio, json, logging, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+logging.disable(logging.INFO)
+
+async def main():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+started = asyncio.run(main())
+print(json.dumps({"import": imported - start, "lifespan": started - imported}))
+"""
+
+
+def import_profile() -> dict[str, float]:
+    """Cumulative import seconds of `app.main`, its direct imports and DEPENDENCIES."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    children: dict[str, float] = {}
+    dependencies: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() in DEPENDENCIES:
+            dependencies[name.strip()] = int(cumulative) / 1e6
+        if depth == 1:
+            children[name.strip()] = int(cumulative) / 1e6
+        elif depth == 0:
+            if name.strip() == "app.main":
+                return {"app.main": int(cumulative) / 1e6, **children, **dependencies}
+            children = {}
+    raise RuntimeError("app.main missing from the import profile")
+
+
+def startup() -> dict[str, float]:
+    """Seconds a fresh process spends importing the app and in its lifespan."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout.splitlines()[-1])
+    return {**timings, "process": time.perf_counter() - start}
+
+
+def main(rounds: int = 5, top: int = 10):
+    imports: dict[str, list[float]] = {}
+    phases: dict[str, list[float]] = {}
+    for _ in range(rounds):
+        for name, seconds in import_profile().items():
+            imports.setdefault(name, []).append(seconds)
+        for name, seconds in startup().items():
+            phases.setdefault(name, []).append(seconds)
+
+    results = {f"startup/{name}": summarize(t) for name, t in phases.items()}
+    results.update({f"import/{name}": summarize(t) for name, t in imports.items()})
+
+    print(f"{'case':>40} {'p50':>10} {'max':>10}")
+    ranked = sorted(results.items(), key=lambda item: -item[1]["p50_ms"])
+    shown = [case for case in results if case.startswith("startup/")]
+    shown += [case for case, _ in ranked if case.startswith("import/")][: top + 1]
+    for case in shown:
+        print(
+            f"{case:>40} {results[case]['p50_ms']:8.1f}ms {results[case]['max_ms']:8.1f}ms"
+        )
+
+    path = write_results("startup", results, {"rounds": rounds})
+    print(f"results: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    main(args.rounds, args.top)
@@ -1,12 +1,17 @@
 import sys
 
 try:
+    import asyncio
     import logging
     import os
+    import time
+    from collections import defaultdict
+    from pathlib import Path
 
-    import requests
+    import httpx
     from dotenv import load_dotenv
     from fastmcp import FastMCP
+    from fastmcp.exceptions import ToolError
 except ImportError as e:
     print(f"Import error: {e}", file=sys.stderr)
     sys.exit(1)
@@ -25,93 +30,264 @@ load_dotenv()
 MCP_PORT = os.getenv("MCP_PORT")
 MCP_HOST = os.getenv("MCP_HOST")
 TRANSPORT = os.getenv("TRANSPORT", "stdio")
+ALKO_BACKEND = os.getenv("ALKO_BACKEND", "http")
 ALKO_API_BASE_URL = os.getenv("BASE_URL")
 ALKO_API_API_VERSION = os.getenv("API_VERSION")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "300"))
+MCP_FIELDS = os.getenv("MCP_FIELDS", "")
+
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# The list tools and the API endpoints behind them.
+LIST_ENDPOINTS = {
+    "product_types": "/products/productTypes",
+    "producers": "/products/producers",
+    "countries": "/products/countries",
+    "areas": "/products/areas",
+}
 
 mcp = FastMCP("Alko Product MCP Server")
 
 
+def product_service():
+    """Import the API's product service, also when run as `python mcp/mcp_server.py`."""
+    root = str(Path(__file__).resolve().parent.parent)
+    if root not in sys.path:
+        sys.path.append(root)
+    import app.services.products
+
+    return app.services.products
+
+
+def compact(products: list[dict], fields: str | None) -> list[dict]:
+    """Keep the requested fields and drop empty values to save tokens.
+
+    Fields are `Product` field names or their serialized keys, comma-separated.
+    An empty selection keeps every field.
+    """
+    columns = product_service().resolve_fields(fields.split(",")) if fields else None
+    return [
+        {
+            key: value
+            for key, value in product.items()
+            if value not in (None, "") and (columns is None or key in columns)
+        }
+        for product in products
+    ]
+
+
+class HttpBackend:
+    """Query the Alko API over HTTP."""
+
+    def __init__(self, base_url: str):
+        # One pooled client for the whole process, so tool calls reuse keep-alive
+        # connections instead of opening a new TCP/TLS connection each time.
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=min(HTTP_TIMEOUT, 5)),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+        )
+        # path -> (fetched_at, etag, data)
+        self.list_cache: dict[str, tuple[float, str | None, object]] = {}
+        self.list_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def fetch(
+        self, path: str, params: dict | None = None, headers: dict | None = None
+    ) -> httpx.Response:
+        """GET from the API, retrying when it is temporarily unavailable.
+
+        Connection failures are retried by the transport; 502/503/504 responses
+        are retried here, honouring Retry-After.
+        """
+        for attempt in range(HTTP_RETRIES + 1):
+            response = await self.client.get(path, params=params, headers=headers)
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt == HTTP_RETRIES
+            ):
+                break
+            try:
+                delay = float(response.headers.get("retry-after", ""))
+            except ValueError:
+                delay = 0.5 * 2**attempt
+            logger.warning(f"{path} returned {response.status_code}, retrying")
+            await asyncio.sleep(min(delay, HTTP_TIMEOUT))
+        if response.is_error:
+            response.raise_for_status()
+        return response
+
+    async def fetch_list(self, path: str):
+        """GET a static list, cached for LIST_CACHE_TTL seconds.
+
+        Stale entries are revalidated with If-None-Match. The API's ETags include
+        the dataset version, so a reload on the API side is picked up on the next
+        revalidation, while an unchanged list only costs a 304.
+        """
+        async with self.list_locks[path]:
+            cached = self.list_cache.get(path)
+            if cached is not None and time.monotonic() - cached[0] < LIST_CACHE_TTL:
+                return cached[2]
+
+            headers = {"If-None-Match": cached[1]} if cached and cached[1] else None
+            response = await self.fetch(path, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                data = cached[2]
+            else:
+                data = response.json()
+            self.list_cache[path] = (
+                time.monotonic(),
+                response.headers.get("etag"),
+                data,
+            )
+            return data
+
+    async def search(self, filters: dict, limit: int) -> list[dict]:
+        response = await self.fetch(
+            "/products/queryProducts", params={**filters, "limit": limit}
+        )
+        return response.json()
+
+    async def list_values(self, name: str) -> list[str]:
+        return await self.fetch_list(LIST_ENDPOINTS[name])
+
+
+class EmbeddedBackend:
+    """Query the product database in this process, without going through the API.
+
+    The database is loaded on the first tool call, from the same snapshot the
+    API uses, and searches run in a worker thread.
+    """
+
+    def __init__(self):
+        self.service = product_service()
+        self.db = None
+        self.lock = asyncio.Lock()
+
+    async def product_db(self):
+        async with self.lock:
+            if self.db is None:
+                self.db = await asyncio.to_thread(self.service.init_product_db)
+        return self.db
+
+    async def search(self, filters: dict, limit: int) -> list[dict]:
+        db = await self.product_db()
+
+        def run() -> list[dict]:
+            results = self.service.search_products(
+                db.df, **filters, index=db.search_index, limit=limit
+            )
+            return self.service.product_frame(results).to_dicts()
+
+        return await asyncio.to_thread(run)
+
+    async def list_values(self, name: str) -> list[str]:
+        db = await self.product_db()
+        return getattr(self.service, f"get_{name}")(db.df)
+
+
+if ALKO_BACKEND == "embedded":
+    backend = EmbeddedBackend()
+else:
+    backend = HttpBackend(f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}")
+
+
 @mcp.resource("alko://health")
 def health_check() -> dict:
-    return {"status": "healthy", "service": "alko-mcp"}
+    return {"status": "healthy", "service": "alko-mcp", "backend": ALKO_BACKEND}
 
 
 @mcp.tool(
     name="search_alko_products",
-    description="Search the product database with search terms.",
+    description="Search the product database with search terms. "
+    "Use `q` for typo-tolerant free text over names, producers and descriptions. "
+    "String filters match substrings; pass a list to match any of several "
+    "values, e.g. country=['Ranska', 'Italia']. Use `operators` for whole-value, "
+    "prefix or excluded matches and exact numbers, keyed by field and suffix, "
+    "e.g. {'country__eq': ['Ranska'], 'name__prefix': ['Chateau'], "
+    "'product_type__not': ['kuohuviinit'], 'liters__in': [0.75, 1.5]}. "
+    "Use `sort` to order results, e.g. -price or price_per_alcohol_liter. "
+    "Use `fields` (comma-separated, e.g. name,price,country) to return only "
+    "the fields you need.",
 )
-def search_products(
+async def search_products(
     limit: int,
-    name: str | None = None,
-    producer: str | None = None,
-    product_type: str | None = None,
-    subtype: str | None = None,
-    country: str | None = None,
-    area: str | None = None,
-    vintage: str | None = None,
-    grapes: str | None = None,
-    special_group: str | None = None,
-    beer_type: str | None = None,
-    package_type: str | None = None,
-    closure_type: str | None = None,
-    assortment: str | None = None,
+    name: str | list[str] | None = None,
+    producer: str | list[str] | None = None,
+    product_type: str | list[str] | None = None,
+    subtype: str | list[str] | None = None,
+    country: str | list[str] | None = None,
+    area: str | list[str] | None = None,
+    vintage: str | list[str] | None = None,
+    grapes: str | list[str] | None = None,
+    special_group: str | list[str] | None = None,
+    beer_type: str | list[str] | None = None,
+    package_type: str | list[str] | None = None,
+    closure_type: str | list[str] | None = None,
+    assortment: str | list[str] | None = None,
     min_price: float | None = None,
     max_price: float | None = None,
     min_alcohol: float | None = None,
     max_alcohol: float | None = None,
     min_sugar: float | None = None,
     max_sugar: float | None = None,
+    q: str | None = None,
+    operators: dict[str, list[str] | list[float]] | None = None,
+    sort: str | None = None,
+    fields: str | None = None,
 ):
-    params = {k: v for k, v in locals().items() if v is not None}
+    filters = {
+        k: v
+        for k, v in locals().items()
+        if v is not None and k not in ("limit", "fields", "operators")
+    }
+    if operators:
+        # Check here, so both backends reject the same keys.
+        known = product_service().ProductFilters.model_fields
+        unknown = sorted(set(operators) - set(known))
+        if unknown:
+            raise ToolError(
+                f"Unknown operators: {', '.join(unknown)}. Use a filter field with "
+                "an optional __eq, __prefix or __not suffix, or a numeric field "
+                "with __in."
+            )
+        filters.update(operators)
 
-    response = requests.get(
-        f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}/products/queryProducts",
-        params=params,
-    )
-    response.raise_for_status()
-    return response.json()
+    products = await backend.search(filters, limit)
+    return compact(products, fields or MCP_FIELDS)
 
 
 @mcp.tool(
     name="get_product_types", description="List all unique product types available."
 )
-def get_product_types():
-    response = requests.get(
-        f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}/products/productTypes",
-    )
-    response.raise_for_status()
-    return response.json()
+async def get_product_types():
+    return await backend.list_values("product_types")
 
 
 @mcp.tool(name="get_producers", description="List all unique producers.")
-def get_producers():
-    response = requests.get(
-        f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}/products/producers",
-    )
-    response.raise_for_status()
-    return response.json()
+async def get_producers():
+    return await backend.list_values("producers")
 
 
 @mcp.tool(name="get_countries", description="List all countries of origin available.")
-def get_countries():
-    response = requests.get(
-        f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}/products/countries",
-    )
-    response.raise_for_status()
-    return response.json()
+async def get_countries():
+    return await backend.list_values("countries")
 
 
 @mcp.tool(name="get_areas", description="List all areas of origin available.")
-def get_areas():
-    response = requests.get(
-        f"{ALKO_API_BASE_URL}/api/{ALKO_API_API_VERSION}/products/areas",
-    )
-    response.raise_for_status()
-    return response.json()
+async def get_areas():
+    return await backend.list_values("areas")
 
 
 if __name__ == "__main__":
     try:
+        logger.info(f"BACKEND: {ALKO_BACKEND}")
         logger.info(f"BASE_URL: {ALKO_API_BASE_URL}")
         logger.info(f"TRANSPORT: {TRANSPORT}")
         logger.info(f"MCP HOST: {MCP_HOST} and PORT: {MCP_PORT}")
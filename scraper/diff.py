@@ -0,0 +1,160 @@
+"""Diff a freshly fetched catalog against the previous one."""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import polars
+
+logger = logging.getLogger(__name__)
+
+CHANGES_SCHEMA = {
+    "changed_at": polars.Datetime("us"),
+    "Numero": polars.Utf8,
+    "Nimi": polars.Utf8,
+    "change": polars.Utf8,
+    "old_price": polars.Float64,
+    "new_price": polars.Float64,
+}
+
+
+def diff_products(
+    previous: polars.DataFrame, current: polars.DataFrame, changed_at: datetime
+) -> polars.DataFrame:
+    """Compare two catalogs by `Numero`.
+
+    Returns one row per added, removed or re-priced product.
+    """
+    old = previous.select(
+        "Numero", "Nimi", polars.col("Hinta").alias("old_price"), old=True
+    )
+    new = current.select(
+        "Numero", "Nimi", polars.col("Hinta").alias("new_price"), new=True
+    )
+    joined = old.join(new, on="Numero", how="full", coalesce=True, suffix="_new")
+
+    change = (
+        polars.when(polars.col("old").is_null())
+        .then(polars.lit("added"))
+        .when(polars.col("new").is_null())
+        .then(polars.lit("removed"))
+        .when(polars.col("old_price").ne_missing(polars.col("new_price")))
+        .then(polars.lit("price_changed"))
+    )
+    return (
+        joined.with_columns(
+            polars.lit(changed_at).alias("changed_at"),
+            polars.coalesce("Nimi_new", "Nimi").alias("Nimi"),
+            change.alias("change"),
+        )
+        .drop_nulls("change")
+        .select(
+            polars.col(column).cast(dtype) for column, dtype in CHANGES_SCHEMA.items()
+        )
+        .sort("change", "Numero")
+    )
+
+
+def _merge_same_day(
+    earlier: polars.DataFrame, rerun: polars.DataFrame
+) -> polars.DataFrame:
+    """Combine a day's logged changes with a rerun diffed against that day's sheet.
+
+    Per product, the old price comes from before the first run and the new
+    price from the rerun; the change is derived again from whether the
+    product existed before the day and exists now, so a product added and
+    removed on the same day drops out.
+    """
+    joined = earlier.join(
+        rerun, on="Numero", how="full", coalesce=True, suffix="_rerun"
+    )
+    logged = polars.col("change").is_not_null()
+    rerun_logged = polars.col("change_rerun").is_not_null()
+    existed = (
+        polars.when(logged)
+        .then(polars.col("change") != "added")
+        .otherwise(polars.col("change_rerun") != "added")
+    )
+    exists = (
+        polars.when(rerun_logged)
+        .then(polars.col("change_rerun") != "removed")
+        .otherwise(polars.col("change") != "removed")
+    )
+    old_price = (
+        polars.when(logged)
+        .then(polars.col("old_price"))
+        .otherwise(polars.col("old_price_rerun"))
+    )
+    new_price = (
+        polars.when(rerun_logged)
+        .then(polars.col("new_price_rerun"))
+        .otherwise(polars.col("new_price"))
+    )
+    change = (
+        polars.when(~existed & exists)
+        .then(polars.lit("added"))
+        .when(existed & ~exists)
+        .then(polars.lit("removed"))
+        .when(existed & exists & old_price.ne_missing(new_price))
+        .then(polars.lit("price_changed"))
+    )
+    return (
+        joined.with_columns(
+            polars.coalesce("changed_at_rerun", "changed_at").alias("changed_at"),
+            polars.coalesce("Nimi_rerun", "Nimi").alias("Nimi"),
+            change.alias("change"),
+            old_price.alias("old_price"),
+            new_price.alias("new_price"),
+        )
+        .drop_nulls("change")
+        .select(list(CHANGES_SCHEMA))
+    )
+
+
+def append_changes(changes: polars.DataFrame, path: Path) -> polars.DataFrame:
+    """Append a diff to the change log, merged with earlier runs of the same day.
+
+    A rerun is diffed against the catalog the earlier run already stored, so
+    its changes are combined with that day's entries instead of replacing them.
+    """
+    if path.exists():
+        log = polars.read_parquet(path)
+        day = changes["changed_at"].dt.date().first()
+        if day is not None:
+            same_day = polars.col("changed_at").dt.date() == day
+            changes = _merge_same_day(log.filter(same_day), changes)
+            log = log.filter(~same_day)
+        changes = polars.concat([log, changes])
+    changes = changes.sort("changed_at", "change", "Numero")
+    changes.write_parquet(path)
+    return changes
+
+
+def write_price_history(
+    current: polars.DataFrame, changes: polars.DataFrame, path: Path, day: datetime
+):
+    """Record new and changed prices in a `date=YYYY-MM-DD` partition.
+
+    The first run records every price; later runs only the rows that moved, so
+    the history stays small and a product's price at any date is its latest
+    entry up to that date. Another run on the same day updates the partition
+    with its prices instead of replacing it.
+    """
+    changed = changes.filter(polars.col("change") != "removed")["Numero"]
+    prices = current.select("Numero", "Hinta")
+    if path.exists():
+        prices = prices.filter(polars.col("Numero").is_in(changed.implode()))
+
+    partition = path / f"date={day:%Y-%m-%d}"
+    partition.mkdir(parents=True, exist_ok=True)
+    file = partition / "prices.parquet"
+    if file.exists():
+        earlier = polars.read_parquet(file)
+        prices = polars.concat(
+            [
+                earlier.filter(~polars.col("Numero").is_in(prices["Numero"].implode())),
+                prices,
+            ]
+        )
+    prices.write_parquet(file)
+    logger.info(f"Wrote {len(prices)} prices to {partition}")
@@ -5,14 +5,24 @@ import json
 import logging
 import os
 import shutil
+import zipfile
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import polars
+import requests
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
+
+from scraper.diff import (
+    CHANGES_SCHEMA,
+    append_changes,
+    diff_products,
+    write_price_history,
+)
+
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,9 +32,74 @@ load_dotenv()
 DOWNLOAD_PATH = Path(__file__).parent / "temp_downloads"
 OUTPUT_PATH = Path(__file__).parent.parent / "data"
 
-
-def _init_driver() -> webdriver.Chrome:
+SHEET_NAME = "Alkon Hinnasto Tekstitiedostona"
+# Zero-based row of the column labels, below the title rows.
+HEADER_ROW = 3
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+# Every column is typed up front so the sheet is parsed and cast in one pass,
+# without guessing types from the first rows.
+SHEET_SCHEMA = {
+    "Numero": polars.Utf8,
+    "Nimi": polars.Utf8,
+    "Valmistaja": polars.Utf8,
+    "Pullokoko": polars.Utf8,
+    "Hinta": polars.Float64,
+    "Litrahinta": polars.Float64,
+    "Uutuus": polars.Utf8,
+    "Hinnastojärjestyskoodi": polars.Utf8,
+    "Tyyppi": polars.Utf8,
+    "Alatyyppi": polars.Utf8,
+    "Erityisryhmä": polars.Utf8,
+    "Oluttyyppi": polars.Utf8,
+    "Valmistusmaa": polars.Utf8,
+    "Alue": polars.Utf8,
+    "Vuosikerta": polars.Int64,
+    "Etikettimerkintöjä": polars.Utf8,
+    "Huomautus": polars.Utf8,
+    "Rypäleet": polars.Utf8,
+    "Luonnehdinta": polars.Utf8,
+    "Pakkaustyyppi": polars.Utf8,
+    "Suljentatyyppi": polars.Utf8,
+    "Alkoholi-%": polars.Float64,
+    "Hapot g/l": polars.Float64,
+    "Sokeri g/l": polars.Int64,
+    "Kantavierrep-%": polars.Utf8,
+    "Väri EBC": polars.Utf8,
+    "Katkerot EBU": polars.Utf8,
+    "Energia kcal/100 ml": polars.Float64,
+    "Valikoima": polars.Utf8,
+    "EAN": polars.Utf8,
+}
+
+
+def download_sheet(url: str, directory: Path) -> Path:
+    """Stream the product sheet to disk over plain HTTP."""
+    target = directory / "alkon-hinnasto.xlsx"
+    temporary = target.with_suffix(".xlsx.part")
+    with requests.get(
+        url,
+        stream=True,
+        timeout=DOWNLOAD_TIMEOUT,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; alko-api)"},
+    ) as response:
+        response.raise_for_status()
+        with temporary.open("wb") as file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+
+    if not zipfile.is_zipfile(temporary):
+        raise ValueError(f"{url} did not return an xlsx workbook")
+    temporary.replace(target)
+    return target
+
+
+def _init_driver() -> "webdriver.Chrome":
     """Initialize a Selenium webdriver instance."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     prefs = {
         "download.default_directory": str(DOWNLOAD_PATH),
@@ -47,9 +122,10 @@ def get_newest_sheet(folder: Path) -> Path:
 
 
 def wait_for_download_to_finish(
-    driver: webdriver.Chrome, directory: Path, timeout: int = 30
+    driver: "webdriver.Chrome", directory: Path, timeout: int = 30
 ) -> Path:
     """Wait for the file to finish downloading."""
+    from selenium.webdriver.support.ui import WebDriverWait
 
     def download_complete(driver):
         xlsx_files = list(directory.glob("*.xlsx"))
@@ -61,52 +137,57 @@ def wait_for_download_to_finish(
     return WebDriverWait(driver=driver, timeout=timeout).until(download_complete)
 
 
-def fetch_and_process() -> polars.DataFrame:
-    """Download and process the Alko product sheet."""
-    logger.info("Fetching product data from Alko...")
-
-    product_sheet_url = os.getenv("ALKO_PRODUCT_SHEET", "")
-    if not product_sheet_url:
-        raise ValueError("ALKO_PRODUCT_SHEET environment variable not set")
-
-    DOWNLOAD_PATH.mkdir(exist_ok=True)
+def download_sheet_with_browser(url: str, directory: Path) -> Path:
+    """Download the product sheet through headless Chrome."""
     driver = _init_driver()
-
     try:
-        driver.get(product_sheet_url)
-        filepath = wait_for_download_to_finish(driver, DOWNLOAD_PATH, timeout=30)
+        driver.get(url)
+        return wait_for_download_to_finish(driver, directory, timeout=30)
     finally:
         driver.quit()
 
-    logger.info(f"Processing {filepath}...")
 
+def read_sheet(filepath: Path) -> polars.DataFrame:
+    """Parse the product sheet with calamine and clean up the text columns."""
     df = polars.read_excel(
-        source=str(filepath),
-        sheet_name="Alkon Hinnasto Tekstitiedostona",
-        engine="xlsx2csv",
-        read_options={
-            "skip_rows": 3,
-            "schema_overrides": {
-                "Nimi": polars.Utf8,
-                "Valmistaja": polars.Utf8,
-                "Hinnastojärjestyskoodi": polars.Utf8,
-                "Numero": polars.Utf8,
-                "EAN": polars.Utf8,
-                "Luonnehdinta": polars.Utf8,
-                "Rypäleet": polars.Utf8,
-            },
-        },
+        source=filepath,
+        sheet_name=SHEET_NAME,
+        engine="calamine",
+        read_options={"header_row": HEADER_ROW},
+        schema_overrides=SHEET_SCHEMA,
     )
 
     df = df.with_columns(polars.col("Uutuus").is_not_null())
-    df = df.with_columns(
+    return df.with_columns(
         polars.col(polars.Utf8).str.replace_all("\xa0", " ").str.strip_chars()
     )
 
-    # Cleanup temp downloads
-    shutil.rmtree(DOWNLOAD_PATH)
 
-    return df
+def fetch_and_process() -> polars.DataFrame:
+    """Download and process the Alko product sheet.
+
+    The sheet is fetched over plain HTTP; headless Chrome is only started when
+    that fails, e.g. because the site refuses non-browser clients.
+    """
+    logger.info("Fetching product data from Alko...")
+
+    product_sheet_url = os.getenv("ALKO_PRODUCT_SHEET", "")
+    if not product_sheet_url:
+        raise ValueError("ALKO_PRODUCT_SHEET environment variable not set")
+
+    DOWNLOAD_PATH.mkdir(exist_ok=True)
+    try:
+        try:
+            filepath = download_sheet(product_sheet_url, DOWNLOAD_PATH)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"HTTP download failed ({e}), falling back to Selenium")
+            filepath = download_sheet_with_browser(product_sheet_url, DOWNLOAD_PATH)
+
+        logger.info(f"Processing {filepath}...")
+        return read_sheet(filepath)
+    finally:
+        # Cleanup temp downloads
+        shutil.rmtree(DOWNLOAD_PATH, ignore_errors=True)
 
 
 def main():
@@ -117,11 +198,22 @@ def main():
 
     output_file = OUTPUT_PATH / "products.parquet"
     metadata_file = OUTPUT_PATH / "metadata.json"
+    changes_file = OUTPUT_PATH / "changes.parquet"
+    history_path = OUTPUT_PATH / "price_history"
+    updated_at = datetime.now()
+
+    changes = polars.DataFrame(schema=CHANGES_SCHEMA)
+    if output_file.exists():
+        changes = diff_products(polars.read_parquet(output_file), df, updated_at)
+        append_changes(changes, changes_file)
+        counts = dict(changes.group_by("change").len().rows())
+        logger.info(f"Changes since the previous fetch: {counts}")
+    write_price_history(df, changes, history_path, updated_at)
 
     df.write_parquet(output_file)
 
     metadata = {
-        "updated_at": datetime.now().isoformat(),
+        "updated_at": updated_at.isoformat(),
         "product_count": len(df),
     }
     metadata_file.write_text(json.dumps(metadata))
@@ -2,9 +2,15 @@ import pytest
 
 from dotenv import load_dotenv
 
+import app.services.products as ps
+
 load_dotenv()
 
+
 def pytest_addoption(parser):
-    parser.addoption(
-        "--query", action="store", help="Query parameter."
-    )
\ No newline at end of file
+    parser.addoption("--query", action="store", help="Query parameter.")
+
+
+@pytest.fixture(scope="session")
+def product_db():
+    return ps.init_product_db()
@@ -0,0 +1,69 @@
+from app.services import compression
+from app.services.cache import ResponseCache, etag_matches
+from app.services.compression import negotiate_encoding
+
+
+def test_response_cache_evicts_least_recently_used():
+    """
+    >>> uv run pytest tests/test_cache.py::test_response_cache_evicts_least_recently_used
+    """
+    cache = ResponseCache(max_entries=2)
+    cache.set("v1", "a", b"a")
+    cache.set("v1", "b", b"b")
+    assert cache.get("v1", "a") is not None
+    cache.set("v1", "c", b"c")
+
+    assert cache.get("v1", "b") is None
+    assert cache.get("v1", "a") is not None
+    assert cache.evictions == 1
+
+
+def test_response_cache_invalidates_on_new_version():
+    """
+    >>> uv run pytest tests/test_cache.py::test_response_cache_invalidates_on_new_version
+    """
+    cache = ResponseCache()
+    entry = cache.set("v1", "a", b"body")
+    assert etag_matches(f"W/{entry.etag}", entry.etag)
+
+    cache.clear("v2")
+    assert cache.get("v1", "a") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.set("v2", "a", b"body").etag != entry.etag
+
+    # A request still on the previous version neither reads nor evicts.
+    cache.set("v1", "a", b"old")
+    assert cache.get("v1", "a") is None
+    assert cache.get("v2", "a").body == b"body"
+    assert cache.stats()["version"] == "v2"
+
+
+def test_response_cache_counts_compressed_copies():
+    """
+    >>> uv run pytest tests/test_cache.py::test_response_cache_counts_compressed_copies
+    """
+    cache = ResponseCache(max_bytes=10)
+    cache.set("v1", "a", b"aaaa")
+    cache.set("v1", "b", b"bbbb")
+    cache.add_encoding("v1", "b", "gzip", b"bb")
+    assert cache.stats()["bytes"] == 10
+
+    cache.add_encoding("v1", "b", "br", b"b")
+    assert cache.get("v1", "a") is None
+    assert cache.get("v1", "b").encodings == {"gzip": b"bb", "br": b"b"}
+
+    cache.add_encoding("v2", "b", "zstd", b"b")
+    assert not cache.holds("v2", "b")
+
+
+def test_negotiate_encoding(monkeypatch):
+    """
+    >>> uv run pytest tests/test_cache.py::test_negotiate_encoding
+    """
+    monkeypatch.setattr(compression, "ENCODERS", {"gzip": bytes, "br": bytes})
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+    assert negotiate_encoding("zstd, *;q=0.1") == "br"
+    assert negotiate_encoding("gzip;q=0, br;q=0") is None
@@ -0,0 +1,54 @@
+import threading
+
+import anyio
+import pytest
+
+from app.services.executor import BoundedExecutor, ExecutorBusyError
+
+
+def test_bounded_executor_runs_off_the_calling_thread():
+    """
+    >>> uv run pytest tests/test_executor.py::test_bounded_executor_runs_off_the_calling_thread
+    """
+    executor = BoundedExecutor(max_workers=2, max_queued=2)
+    caller = threading.get_ident()
+
+    result = anyio.run(executor.run, threading.get_ident)
+
+    assert result != caller
+    assert executor.stats()["completed"] == 1
+
+
+def test_bounded_executor_rejects_when_queue_is_full():
+    """
+    >>> uv run pytest tests/test_executor.py::test_bounded_executor_rejects_when_queue_is_full
+    """
+    executor = BoundedExecutor(max_workers=1, max_queued=1)
+    release = threading.Event()
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(executor.run, release.wait)
+            tg.start_soon(executor.run, release.wait)
+            await anyio.sleep(0.05)
+            with pytest.raises(ExecutorBusyError):
+                await executor.run(release.wait)
+            release.set()
+
+    anyio.run(main)
+    assert executor.rejected == 1
+    assert executor.completed == 2
+
+
+def test_bounded_executor_counts_failed_calls():
+    """
+    >>> uv run pytest tests/test_executor.py::test_bounded_executor_counts_failed_calls
+    """
+    executor = BoundedExecutor(max_workers=1, max_queued=1)
+
+    with pytest.raises(ZeroDivisionError):
+        anyio.run(executor.run, lambda: 1 / 0)
+
+    stats = executor.stats()
+    assert stats["completed"] == 1
+    assert stats["pending"] == 0
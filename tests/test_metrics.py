@@ -0,0 +1,24 @@
+from app.services.metrics import Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    >>> uv run pytest tests/test_metrics.py::test_histogram_renders_cumulative_buckets
+    """
+    histogram = Histogram("stage_seconds", "Stage time.", ("stage",), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "filter")
+    histogram.observe(0.01, 'say "hi"')
+
+    lines = histogram.render()
+
+    assert lines[:2] == [
+        "# HELP stage_seconds Stage time.",
+        "# TYPE stage_seconds histogram",
+    ]
+    assert 'stage_seconds_bucket{stage="filter",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="filter",le="1.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="filter",le="+Inf"} 4' in lines
+    assert 'stage_seconds_sum{stage="filter"} 6.05' in lines
+    assert 'stage_seconds_count{stage="filter"} 4' in lines
+    assert 'stage_seconds_count{stage="say \\"hi\\""} 1' in lines
@@ -0,0 +1,424 @@
+import io
+from datetime import datetime
+
+import orjson
+import polars
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_get_product_by_id(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_get_product_by_id
+    """
+    response = client.get("/products/906458")
+    assert response.status_code == 200
+    assert [p["Numero"] for p in response.json()] == ["906458"]
+    assert client.get("/products/000000").json() == []
+
+
+def test_get_product_by_ean(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_get_product_by_ean
+    """
+    response = client.get("/products/ean/7350084980013")
+    assert [p["Numero"] for p in response.json()] == ["906458"]
+
+
+def test_get_products_batch(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_get_products_batch
+    """
+    response = client.post(
+        "/products/batch",
+        json={
+            "product_ids": ["447237", "906458", "missing"],
+            "eans": ["7350084980013"],
+        },
+    )
+    assert response.status_code == 200
+    assert [p["Numero"] for p in response.json()] == ["447237", "906458"]
+
+
+def test_conditional_request_returns_not_modified(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_conditional_request_returns_not_modified
+    """
+    response = client.get("/products/countries")
+    etag = response.headers["etag"]
+    cached = client.get("/products/countries", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+
+def test_export_products_streams_ndjson(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_export_products_streams_ndjson
+    """
+    response = client.get(
+        "/products/export", params={"country": "Ranska", "fields": "product_id,price"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    queried = client.get(
+        "/products/queryProducts", params={"country": "Ranska", "limit": 100000}
+    ).json()
+    assert len(rows) == len(queried)
+    assert rows[0] == {"Numero": queried[0]["Numero"], "Hinta": queried[0]["Hinta"]}
+
+
+def test_export_products_rejects_unknown_fields(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_export_products_rejects_unknown_fields
+    """
+    response = client.get("/products/export", params={"fields": "price,color"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    ("media_type", "read"),
+    [
+        ("application/vnd.apache.arrow.stream", polars.read_ipc_stream),
+        ("application/x-parquet", polars.read_parquet),
+    ],
+)
+def test_query_products_negotiates_binary_formats(client, media_type, read):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_negotiates_binary_formats
+    """
+    params = {"country": "Italia", "limit": 50}
+    response = client.get(
+        "/products/queryProducts",
+        params=params,
+        headers={"Accept": f"{media_type}, application/json;q=0.5"},
+    )
+    assert response.headers["content-type"] == media_type
+
+    frame = read(io.BytesIO(response.content))
+    queried = client.get("/products/queryProducts", params=params).json()
+    assert frame["Numero"].to_list() == [p["Numero"] for p in queried]
+
+
+def test_admin_reload_swaps_dataset(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_admin_reload_swaps_dataset
+    """
+    previous = app.state.products
+    app.state.admin_token = "secret"
+    try:
+        assert client.post("/admin/reload").status_code == 401
+        response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+    finally:
+        app.state.admin_token = None
+
+    assert response.status_code == 200
+    assert response.json()["version"] == previous.version
+    assert app.state.products is not previous
+    assert client.post("/admin/reload").status_code == 404
+
+
+def test_query_products_returns_plan_on_request(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_returns_plan_on_request
+    """
+    response = client.get(
+        "/products/queryProducts",
+        params={"country": "Italia", "max_price": 15, "limit": 5},
+        headers={"X-Debug-Plan": "1"},
+    )
+    assert len(response.json()) == 5
+    assert response.headers["X-Query-Plan"].startswith("index(Valmistusmaa)")
+    # One row past the page tells whether another page follows.
+    assert "limit 6" in response.headers["X-Query-Plan"]
+
+    # The plan is cached with the body but only shown on request.
+    params = {"country": "Italia", "max_price": 15, "limit": 5}
+    cursor = response.headers["X-Next-Cursor"]
+    assert (
+        "X-Query-Plan"
+        not in client.get("/products/queryProducts", params=params).headers
+    )
+    paged = client.get(
+        "/products/queryProducts",
+        params={**params, "cursor": cursor},
+        headers={"X-Debug-Plan": "1"},
+    )
+    assert "after cursor" in paged.headers["X-Query-Plan"]
+    faceted = client.get(
+        "/products/queryProducts",
+        params={**params, "facets": "area"},
+        headers={"X-Debug-Plan": "1"},
+    )
+    assert "limit" not in faceted.headers["X-Query-Plan"]
+
+
+def test_query_products_with_facets(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_with_facets
+    """
+    response = client.get(
+        "/products/queryProducts",
+        params={"product_type": "punaviinit", "limit": 3, "facets": "country,area"},
+    )
+    body = response.json()
+    assert len(body["products"]) == 3
+
+    total = sum(item["count"] for item in body["facets"]["country"])
+    everything = client.get(
+        "/products/queryProducts",
+        params={"product_type": "punaviinit", "limit": 100000},
+    ).json()
+    assert total == sum(1 for p in everything if p["Valmistusmaa"])
+    assert (
+        client.get("/products/queryProducts", params={"facets": "colour"}).status_code
+        == 400
+    )
+
+    # Pages with facets match the plain pages; facets always cover every match.
+    params = {"product_type": "punaviinit", "sort": "-price", "limit": 3}
+    plain = client.get("/products/queryProducts", params=params)
+    cursor = plain.headers["X-Next-Cursor"]
+    first = client.get("/products/queryProducts", params={**params, "facets": "area"})
+    assert first.json()["products"] == plain.json()
+    assert first.json()["next_cursor"] == cursor
+    second = client.get(
+        "/products/queryProducts", params={**params, "facets": "area", "cursor": cursor}
+    ).json()
+    assert second["facets"] == first.json()["facets"]
+    assert (
+        second["products"]
+        == client.get(
+            "/products/queryProducts", params={**params, "cursor": cursor}
+        ).json()
+    )
+
+
+def test_get_stats(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_get_stats
+    """
+    stats = client.get("/products/stats").json()
+    price = stats["numeric"]["price"]
+    assert sum(bin["count"] for bin in price["histogram"]) == price["count"]
+    assert price["min"] <= price["percentiles"]["p50"] <= price["max"]
+    assert client.get("/stats").status_code == 200
+
+
+def test_health_probes(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_health_probes
+    """
+    assert client.get("/livez").json() == {"status": "ok"}
+
+    ready = client.get("/readyz").json()
+    db = app.state.products
+    assert ready["status"] == "healthy"
+    assert ready["version"] == db.version
+    assert ready["product_count"] == db.product_count
+    assert all(ready["indexes"].values())
+
+    first = client.get("/health")
+    assert first.status_code == 200
+    assert app.state.health_page[0] == db.version
+    assert client.get("/").text == first.text
+
+    stats = client.get("/stats")
+    assert stats.status_code == 200
+    assert app.state.stats_page == (db.version, stats.text)
+
+
+def test_query_products_fuzzy(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_fuzzy
+    """
+    response = client.get(
+        "/products/queryProducts", params={"q": "chateau margoux", "limit": 3}
+    )
+    assert response.status_code == 200
+    assert all("Margaux" in product["Nimi"] for product in response.json())
+
+
+def test_get_changes(client, monkeypatch):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_get_changes
+    """
+    changes = polars.DataFrame(
+        {
+            "changed_at": [datetime(2026, 1, 26), datetime(2026, 2, 2)],
+            "Numero": ["906458", "447237"],
+            "change": ["added", "price_changed"],
+        }
+    )
+    monkeypatch.setattr(app.state.products, "changes", changes)
+    app.state.response_cache.clear()
+
+    assert len(client.get("/products/changes").json()) == 2
+    recent = client.get("/products/changes", params={"since": "2026-01-26T00:00:00"})
+    assert recent.json() == [
+        {
+            "changed_at": "2026-02-02T00:00:00.000000",
+            "Numero": "447237",
+            "change": "price_changed",
+        }
+    ]
+    # Timezone-aware times are compared in local time, like `changed_at`.
+    for since in ("2026-01-30T00:00:00Z", "2026-01-30T02:00:00+02:00"):
+        response = client.get("/products/changes", params={"since": since})
+        assert response.status_code == 200
+        assert response.json() == recent.json()
+
+
+def test_query_products_sort_and_cursor(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_sort_and_cursor
+    """
+    params = {"product_type": "punaviinit", "sort": "-price", "limit": 5}
+    first = client.get("/products/queryProducts", params=params)
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/products/queryProducts", params={**params, "cursor": cursor})
+    prices = [product["Hinta"] for product in first.json() + second.json()]
+    assert prices == sorted(prices, reverse=True)
+
+    envelope = client.get(
+        "/products/queryProducts", params={**params, "facets": "country"}
+    ).json()
+    assert envelope["next_cursor"] == cursor
+    assert (
+        client.get(
+            "/products/queryProducts", params={**params, "sort": "price"}
+        ).headers.get("X-Next-Cursor")
+        != cursor
+    )
+    assert (
+        client.get(
+            "/products/queryProducts", params={**params, "sort": "colour"}
+        ).status_code
+        == 400
+    )
+    assert (
+        client.get("/products/queryProducts", params={"cursor": cursor}).status_code
+        == 400
+    )
+
+    # A cursor only resumes the query it came from.
+    for other in ({"product_type": "valkoviinit"}, {"country": "Espanja"}):
+        response = client.get(
+            "/products/queryProducts", params={**params, **other, "cursor": cursor}
+        )
+        assert response.status_code == 400
+    countries = {"country": ["Italia", "Ranska"], "limit": 5}
+    cursor = client.get("/products/queryProducts", params=countries).headers[
+        "X-Next-Cursor"
+    ]
+    reordered = {**countries, "country": ["Ranska", "Italia"], "cursor": cursor}
+    assert client.get("/products/queryProducts", params=reordered).status_code == 200
+
+
+def test_metrics(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_metrics
+    """
+    response = client.get(
+        "/products/queryProducts",
+        params={"country": "Ranska", "sort": "price", "limit": 7},
+        headers={"X-Debug-Timing": "1"},
+    )
+    timing = response.headers["server-timing"]
+    for name in ("queue", "filter", "materialize", "serialize", "total"):
+        assert f"{name};dur=" in timing
+    assert "server-timing" not in client.get("/products/906458").headers
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain")
+    text = metrics.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'endpoint="/products/{product_id}",status="200"}'
+    ) in text
+    assert (
+        'request_stage_duration_seconds_count{endpoint="/products/queryProducts",'
+        'stage="serialize"}'
+    ) in text
+    assert (
+        'search_result_rows_bucket{endpoint="/products/queryProducts",le="10"}' in text
+    )
+    assert 'dataset_load_duration_seconds_count{trigger="startup"}' in text
+    assert "response_cache_hits_total " in text
+    assert "executor_completed_total " in text
+
+
+def test_compressed_responses(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_compressed_responses
+    """
+    url = "/products/queryProducts?country=Italia&limit=50"
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    second = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"] == second.headers["etag"] != plain.headers["etag"]
+    assert first.content == second.content == plain.content
+    assert "Accept-Encoding" in first.headers["vary"]
+    assert (
+        client.get(
+            url,
+            headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]},
+        ).status_code
+        == 304
+    )
+
+    small = client.get("/products/906458", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_query_products_filter_operators(client):
+    """
+    >>> uv run pytest tests/test_products_router.py::test_query_products_filter_operators
+    """
+    response = client.get(
+        "/products/queryProducts",
+        params=[
+            ("country", "Ranska"),
+            ("country", "Italia"),
+            ("product_type__eq", "punaviinit"),
+            ("liters__in", 1.5),
+            ("limit", 1000),
+        ],
+        headers={"X-Debug-Plan": "1"},
+    )
+    assert response.status_code == 200
+    products = response.json()
+    assert {p["Valmistusmaa"] for p in products} == {"Ranska", "Italia"}
+    assert {p["Tyyppi"] for p in products} == {"punaviinit"}
+    assert {p["Pullokoko l"] for p in products} == {1.5}
+    assert 'Tyyppi in ["punaviinit"]' in response.headers["X-Query-Plan"]
+
+    response = client.get(
+        "/products/export",
+        params={"name__prefix": "koskenkorva", "product_type__not": "vodkat"},
+    )
+    exported = [orjson.loads(line) for line in response.text.splitlines()]
+    assert exported
+    assert all(p["Nimi"].startswith("Koskenkorva") for p in exported)
+    assert all(p["Tyyppi"] != "vodkat" for p in exported)
+
+    response = client.get("/products/queryProducts", params={"price__in": "abc"})
+    assert response.status_code == 422
+    for path in ("/products/queryProducts", "/products/export"):
+        for misspelled in ("country__eqq", "min_prise"):
+            response = client.get(path, params={misspelled: "Ranska"})
+            assert response.status_code == 422
+    # Other unknown parameters, such as cache busters, are still ignored.
+    response = client.get("/products/queryProducts", params={"_": 123, "limit": 1})
+    assert response.status_code == 200
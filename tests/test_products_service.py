@@ -1,10 +1,236 @@
+import orjson
+import polars
 import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
 
 import app.services.products as ps
-from app.schemas.products import Products, Product
+from app.schemas.products import Product, ProductFilters
+
 
 def test_init_product_db(request):
     """
     >>> uv run pytest tests/test_products_service.py::test_init_product_db
     """
-    products = ps.init_product_db()
\ No newline at end of file
+    products = ps.init_product_db()
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"country": "Ranska"},
+        {"name": "cabernet sauvignon", "max_price": 20},
+        {"grapes": "pinot", "area": "bourgogne"},
+        {"product_type": "viini", "country": "italia", "min_alcohol": 13},
+        {"vintage": "2019"},
+        {"name": "&"},
+        {"producer": "no such producer"},
+    ],
+)
+def test_search_products_index_matches_scan(product_db, filters):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_search_products_index_matches_scan
+    """
+    db = product_db
+    scanned = ps.search_products(db.df, **filters)
+    indexed = ps.search_products(db.df, index=db.search_index, **filters)
+    assert indexed.equals(scanned)
+
+
+def test_search_products_ignores_accents(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_search_products_ignores_accents
+    """
+    db = product_db
+    plain = ps.search_products(db.df, name="chateau", index=db.search_index)
+    accented = ps.search_products(db.df, name="Château", index=db.search_index)
+    assert plain.height > 0
+    assert plain.equals(accented)
+
+
+def test_search_products_fuzzy_tolerates_typos(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_search_products_fuzzy_tolerates_typos
+    """
+    db = product_db
+    exact = ps.search_products(db.df, name="koskenkorva", index=db.search_index)
+    typo = ps.search_products(db.df, q="koskenkorav", index=db.search_index, limit=5)
+    assert typo.height == 5
+    assert set(typo["Numero"]) <= set(exact["Numero"])
+
+    fuzzy = ps.search_products(
+        db.df, name="koskenkorav", fuzzy=True, max_price=5, index=db.search_index
+    )
+    assert fuzzy.height > 0
+    assert (fuzzy["Hinta"] <= 5).all()
+    assert ps.search_products(db.df, q="koskenkorav", limit=5).equals(typo)
+
+
+def test_search_page_cursor_walks_sorted_results(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_search_page_cursor_walks_sorted_results
+    """
+    db = product_db
+    filters = ProductFilters(country="Ranska")
+    expected = ps.search_products(
+        db.df, country="Ranska", index=db.search_index, sort="-price,name"
+    )
+    prices = expected["Hinta"].drop_nulls()
+    assert prices.equals(prices.sort(descending=True))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor, _ = ps.search_page(
+            db.df, filters, db.search_index, 700, "-price,name", cursor, db.version
+        )
+        seen.extend(page["Numero"])
+        if cursor is None:
+            break
+    assert seen == expected["Numero"].to_list()
+
+    with pytest.raises(ValueError):
+        ps.search_page(db.df, filters, db.search_index, 10, "colour")
+    with pytest.raises(ValueError):
+        ps.search_page(db.df, filters, db.search_index, 10, "price", cursor="abc")
+
+
+def test_derived_columns_filter_and_sort(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_derived_columns_filter_and_sort
+    """
+    db = product_db
+    results = ps.search_products(
+        db.df,
+        min_liters=0.7,
+        max_liters=0.75,
+        max_price_per_alcohol_liter=100,
+        index=db.search_index,
+        sort="price_per_alcohol_liter",
+    )
+    assert results.height > 0
+    assert results["Pullokoko l"].is_between(0.7, 0.75).all()
+    per_liter = results["Alkoholilitrahinta"]
+    assert per_liter.equals(per_liter.sort())
+    expected = results["Hinta"] / (results["Pullokoko l"] * results["Alkoholi-%"] / 100)
+    assert (per_liter - expected).abs().max() < 0.01
+
+
+def test_serialize_products_matches_validated_models(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_serialize_products_matches_validated_models
+    """
+    df = product_db.df.filter(product_db.df["Luonnehdinta"].is_not_null()).head(500)
+    products = TypeAdapter(list[Product]).validate_python(df.to_dicts())
+    expected = orjson.dumps(jsonable_encoder(products))
+    assert ps.serialize_products(df) == expected
+
+
+def test_plan_search_runs_selective_predicates_first(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_plan_search_runs_selective_predicates_first
+    """
+    filters = ProductFilters(name="pinot noir", min_price=500, max_alcohol=20)
+    plan = ps.plan_search(product_db.df, filters, index=product_db.search_index)
+
+    assert plan.index_columns == ["Nimi"]
+    assert plan.predicates[0].column == "Hinta"
+    assert {p.column for p in plan.predicates} == {"Hinta", "Alkoholi-%", "Nimi"}
+
+    results = ps.execute_search(product_db.df, plan, index=product_db.search_index)
+    expected = ps.search_products(
+        product_db.df, name="pinot noir", min_price=500, max_alcohol=20
+    )
+    assert results.equals(expected)
+
+
+def test_optimize_schema_reads_distinct_values_from_enums(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_optimize_schema_reads_distinct_values_from_enums
+    """
+    assert isinstance(product_db.df.schema["Valmistusmaa"], polars.Enum)
+    raw = polars.read_parquet(ps.DATA_PATH / "products.parquet")
+    assert ps.get_countries(product_db.df) == sorted(
+        raw["Valmistusmaa"].drop_nulls().unique()
+    )
+    assert product_db.df.estimated_size() < raw.estimated_size()
+
+
+def test_init_product_db_memory_maps_fresh_snapshot(tmp_path, monkeypatch):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_init_product_db_memory_maps_fresh_snapshot
+    """
+    monkeypatch.setattr(ps, "SNAPSHOT_PATH", tmp_path)
+    built = ps.init_product_db()
+    assert (tmp_path / "manifest.json").exists()
+
+    mapped = ps.init_product_db()
+    assert mapped.df.equals(built.df)
+    assert mapped.search_index.tokens.keys() == built.search_index.tokens.keys()
+    filters = {"name": "pinot noir", "country": "ranska", "max_price": 30}
+    assert ps.search_products(mapped.df, **filters, index=mapped.search_index).equals(
+        ps.search_products(built.df, **filters, index=built.search_index)
+    )
+    assert mapped.id_index.equals(built.id_index)
+    assert mapped.stats == built.stats
+    assert mapped.search_index.fuzzy.words == built.search_index.fuzzy.words
+    assert ps.search_products(
+        mapped.df, q="koskenkorav", index=mapped.search_index, limit=5
+    ).equals(
+        ps.search_products(built.df, q="koskenkorav", index=built.search_index, limit=5)
+    )
+    assert ps.get_products_by_ids(
+        mapped, product_ids=["906458", "missing", "447237"], eans=["7350084980013"]
+    )["Numero"].to_list() == ["906458", "447237"]
+
+
+def test_filter_operators_and_multiple_values(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_filter_operators_and_multiple_values
+    """
+    db = product_db
+    country = ps.normalize_expr("Valmistusmaa")
+    product_type = ps.normalize_expr("Tyyppi")
+    name = ps.normalize_expr("Nimi")
+    cases = [
+        (
+            {"country": ["ranska", "Italia"], "liters__in": [0.75, 1.5]},
+            country.str.contains_any(["ranska", "italia"])
+            & polars.col("Pullokoko l").is_in([0.75, 1.5]),
+        ),
+        (
+            {"product_type__eq": "punaviinit", "country__not": ["ranska", "italia"]},
+            (product_type == "punaviinit")
+            & ~country.str.contains_any(["ranska", "italia"]),
+        ),
+        (
+            {"name__prefix": ["koskenkorva", "Chateau"], "sugar__in": 0},
+            (name.str.starts_with("koskenkorva") | name.str.starts_with("chateau"))
+            & (polars.col("Sokeri g/l") == 0),
+        ),
+    ]
+    for filters, expr in cases:
+        expected = db.df.filter(expr.fill_null(False))["Numero"]
+        assert expected.len() > 0, filters
+        for index in (db.search_index, None):
+            results = ps.search_products(db.df, **filters, index=index)
+            assert results["Numero"].equals(expected), filters
+
+    # `__eq` matches whole values only, where the plain filter matches substrings.
+    assert ps.search_products(db.df, product_type__eq="viinit").is_empty()
+    assert not ps.search_products(db.df, product_type="viinit").is_empty()
+    with pytest.raises(TypeError):
+        ps.search_products(db.df, colour="red")
+
+
+def test_ascending_sort_ranks_nulls_last(product_db):
+    """
+    >>> uv run pytest tests/test_products_service.py::test_ascending_sort_ranks_nulls_last
+    """
+    db = product_db
+    for field in ("vintage", "sugar", "price_per_drink"):
+        column = ps.SORT_COLUMNS[field]
+        assert db.df[column].null_count() > 0
+        for index in (db.search_index, None):
+            values = ps.search_products(db.df, index=index, sort=field)[column]
+            assert values[0] is not None
+            assert values.equals(values.sort(nulls_last=True)), field
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import polars
+
+from scraper.diff import append_changes, diff_products, write_price_history
+from scraper.fetch_products import read_sheet
+from tests.workbook import write_sample_workbook
+
+
+def test_read_sheet(tmp_path):
+    """
+    >>> uv run pytest tests/test_scraper.py::test_read_sheet
+    """
+    products = polars.read_parquet("data/products.parquet").head(200)
+    workbook = tmp_path / "alkon-hinnasto.xlsx"
+    write_sample_workbook(products, workbook)
+    assert read_sheet(workbook).equals(products)
+
+
+def test_diff_products(tmp_path):
+    """
+    >>> uv run pytest tests/test_scraper.py::test_diff_products
+    """
+    previous = polars.DataFrame(
+        {"Numero": ["1", "2", "3"], "Nimi": ["a", "b", "c"], "Hinta": [1.0, 2.0, 3.0]}
+    )
+    current = polars.DataFrame(
+        {"Numero": ["2", "3", "4"], "Nimi": ["b", "c", "d"], "Hinta": [2.0, 3.5, 4.0]}
+    )
+    changes = diff_products(previous, current, datetime(2026, 2, 9))
+    assert changes.select("Numero", "change").rows() == [
+        ("4", "added"),
+        ("3", "price_changed"),
+        ("1", "removed"),
+    ]
+
+    log = tmp_path / "changes.parquet"
+    append_changes(changes, log)
+    assert append_changes(changes, log).height == 3
+
+    history = tmp_path / "price_history"
+    write_price_history(previous, changes.clear(), history, datetime(2026, 2, 2))
+    write_price_history(current, changes, history, datetime(2026, 2, 9))
+    prices = polars.read_parquet(history, hive_partitioning=True)
+    assert prices.filter(polars.col("Numero") == "3")["Hinta"].to_list() == [3.0, 3.5]
+    assert prices.height == 5
+
+
+def test_same_day_rerun_merges_changes(tmp_path):
+    """
+    >>> uv run pytest tests/test_scraper.py::test_same_day_rerun_merges_changes
+    """
+    week1 = polars.DataFrame(
+        {"Numero": ["1", "2", "3"], "Nimi": ["a", "b", "c"], "Hinta": [1.0, 2.0, 3.0]}
+    )
+    week2 = polars.DataFrame(
+        {"Numero": ["2", "3", "4"], "Nimi": ["b", "c", "d"], "Hinta": [2.0, 3.5, 4.0]}
+    )
+    rerun = polars.DataFrame(
+        {"Numero": ["2", "3"], "Nimi": ["b", "c"], "Hinta": [2.5, 3.5]}
+    )
+    monday, later = datetime(2026, 2, 9, 6), datetime(2026, 2, 9, 12)
+    log = tmp_path / "changes.parquet"
+    history = tmp_path / "price_history"
+    changes = diff_products(week1, week2, monday)
+    write_price_history(week1, changes.clear(), history, datetime(2026, 2, 2))
+    append_changes(changes, log)
+    write_price_history(week2, changes, history, monday)
+
+    # Nothing changed since the first run: the day keeps its changes and prices.
+    empty = diff_products(week2, week2, later)
+    assert append_changes(empty, log).height == 3
+    write_price_history(week2, empty, history, later)
+    prices = polars.read_parquet(history, hive_partitioning=True)
+    assert prices.filter(polars.col("Numero") == "3")["Hinta"].to_list() == [3.0, 3.5]
+    assert "4" in prices["Numero"].to_list()
+
+    # A rerun with new changes is combined with the day's earlier ones.
+    changes = diff_products(week2, rerun, later)
+    merged = append_changes(changes, log)
+    assert sorted(
+        merged.select("Numero", "change", "old_price", "new_price").rows()
+    ) == [
+        ("1", "removed", 1.0, None),
+        ("2", "price_changed", 2.0, 2.5),
+        ("3", "price_changed", 3.0, 3.5),
+    ]
+    write_price_history(rerun, changes, history, later)
+    day = polars.read_parquet(history / "date=2026-02-09" / "prices.parquet")
+    assert sorted(day.rows()) == [("2", 2.5), ("3", 3.5), ("4", 4.0)]